@@ -1,14 +1,60 @@
 import random
-import itertools
 import math
+import os
 import time
-from game_environment import KabaddiGame
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from game_environment import KabaddiGame, OPPONENT
+from batch_simulator import BatchSimulator
+from tablebase import load_tablebase
+import numpy as np
+
+DANGER_OFFSETS = [(dx, dy, abs(dx) + abs(dy)) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) < 3]
+
+class SearchStats:
+    # Filled in by an agent after enable_stats(); agents without it keep stats = None
+    # and only pay for the None checks.
+    COUNTERS = ('moves', 'nodes', 'leaf_evals', 'clones', 'cutoffs', 'iterations', 'rollouts')
+    __slots__ = COUNTERS + ('max_depth', 'time')
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.max_depth = 0
+        self.time = Counter()
+
+    def record_move(self, elapsed):
+        self.moves += 1
+        self.time['select_moves'] += elapsed
+
+    def as_dict(self):
+        summary = {name: getattr(self, name) for name in self.COUNTERS}
+        summary['max_depth'] = self.max_depth
+        summary['time'] = dict(self.time)
+        return summary
+
+    @staticmethod
+    def merge(total, summary):
+        # Adds one as_dict() summary into another, e.g. over the games of a tournament.
+        for name in SearchStats.COUNTERS:
+            total[name] = total.get(name, 0) + summary[name]
+        total['max_depth'] = max(total.get('max_depth', 0), summary['max_depth'])
+        times = total.setdefault('time', {})
+        for phase, elapsed in summary['time'].items():
+            times[phase] = times.get(phase, 0.0) + elapsed
+        return total
 
 class Agent:
     def __init__(self, team):
         if team not in ['A', 'B']:
             raise ValueError("Team must be 'A' or 'B'")
         self.team = team
+        self.stats = None
+
+    def enable_stats(self):
+        self.stats = SearchStats()
+        return self.stats
 
     def select_moves(self, game: KabaddiGame):
         raise NotImplementedError
@@ -16,235 +62,865 @@ class Agent:
 class RandomAgent(Agent):
     def select_moves(self, game: KabaddiGame):
         moves = {}
-        active_players = [p for p in game.state.players.values() if p.team == self.team and not p.is_captured]
+        active_players = [p for p in game.state.teams[self.team] if not p.is_captured]
         for player in active_players:
             valid_moves = game.get_valid_moves(player.id)
             if valid_moves:
                 moves[player.id] = random.choice(valid_moves)
         return moves
 
+class IncrementalEvaluator:
+    # GreedyAgent's evaluation of one game, kept up to date as the game's observer. A move only
+    # re-scores the players that moved and the raider/opponent pairs they are in, and undo pops the
+    # totals saved before the move. Pickups and captures are rare and rescore everything.
+    def __init__(self, game, team):
+        self.game = game
+        self.team = team
+        self.opponent_team = OPPONENT[team]
+        state = game.state
+        self.mine = state.teams[team]
+        self.theirs = state.teams[self.opponent_team]
+        self.distance = state.grid_tables.distance
+        self.home_distance = state.grid_tables.home_distance[team]
+        self.raid_zone = state.grid_tables.enemy_territory[team]
+        self.defence_zone = state.grid_tables.enemy_territory[self.opponent_team]
+        self.history = []
+        self.refresh()
+
+    def refresh(self):
+        # totals: opponents at distance 0, 1 and 2 from our raiders, then the per-player score, our
+        # free players, their free players' distance to our gold, and gold carried home by each side.
+        state = self.game.state
+        self.my_gold_pos = state.gold_pos[self.team]
+        self.opponent_gold_pos = state.gold_pos[self.opponent_team]
+        distance = self.distance
+        totals = [0, 0, 0, 0, 0, 0, 0, 0]
+        for player in self.mine:
+            if player.is_captured:
+                totals[3] -= 1000
+                continue
+            totals[4] += 1
+            if player.has_gold:
+                totals[3] += 500 - self.home_distance[player.pos[0]] * 10
+            elif self.opponent_gold_pos:
+                totals[3] -= distance[self.opponent_gold_pos][player.pos] * 5
+            if self.raid_zone[player.pos[0]]:
+                to_raider = distance[player.pos]
+                for opponent in self.theirs:
+                    if not opponent.is_captured:
+                        dist_to_opp = to_raider[opponent.pos]
+                        if dist_to_opp < 3: totals[dist_to_opp] += 1
+        for opponent in self.theirs:
+            if not opponent.is_captured and self.my_gold_pos:
+                totals[5] += distance[self.my_gold_pos][opponent.pos]
+        totals[6] = sum(p.has_gold and not self.raid_zone[p.pos[0]] for p in self.mine)
+        totals[7] = sum(p.has_gold and not self.defence_zone[p.pos[0]] for p in self.theirs)
+        self.totals = totals
+        self.my_wiped = all(p.is_captured for p in self.mine)
+        self.their_wiped = all(p.is_captured for p in self.theirs)
+
+    def applied(self, undo):
+        moved, pickups, captures, _, _ = undo
+        totals = self.totals
+        self.history.append(totals[:])
+        if pickups or captures: return self.refresh()
+        distance = self.distance
+        raid_zone = self.raid_zone
+        team = self.team
+        # Movers are applied one at a time; those not yet applied still stand on their old square.
+        pending = {player: old_pos for player, old_pos in moved if old_pos != player.pos}
+        for player, old_pos in moved:
+            if player not in pending: continue
+            del pending[player]
+            new_pos = player.pos
+            if player.team == team:
+                if player.has_gold:
+                    totals[3] -= (self.home_distance[new_pos[0]] - self.home_distance[old_pos[0]]) * 10
+                    totals[6] += raid_zone[old_pos[0]] - raid_zone[new_pos[0]]
+                elif self.opponent_gold_pos:
+                    to_gold = distance[self.opponent_gold_pos]
+                    totals[3] -= (to_gold[new_pos] - to_gold[old_pos]) * 5
+                for pos, sign in ((old_pos, -1), (new_pos, 1)):
+                    if not raid_zone[pos[0]]: continue
+                    to_raider = distance[pos]
+                    for opponent in self.theirs:
+                        if not opponent.is_captured:
+                            dist_to_opp = to_raider[pending.get(opponent, opponent.pos)]
+                            if dist_to_opp < 3: totals[dist_to_opp] += sign
+            else:
+                if self.my_gold_pos:
+                    to_gold = distance[self.my_gold_pos]
+                    totals[5] += to_gold[new_pos] - to_gold[old_pos]
+                if player.has_gold:
+                    totals[7] += self.defence_zone[old_pos[0]] - self.defence_zone[new_pos[0]]
+                to_old, to_new = distance[old_pos], distance[new_pos]
+                for raider in self.mine:
+                    if raider.is_captured: continue
+                    raider_pos = pending.get(raider, raider.pos)
+                    if not raid_zone[raider_pos[0]]: continue
+                    dist_to_opp = to_old[raider_pos]
+                    if dist_to_opp < 3: totals[dist_to_opp] -= 1
+                    dist_to_opp = to_new[raider_pos]
+                    if dist_to_opp < 3: totals[dist_to_opp] += 1
+
+    def undone(self, undo):
+        self.totals = self.history.pop()
+        if undo[1] or undo[2]:
+            state = self.game.state
+            self.my_gold_pos = state.gold_pos[self.team]
+            self.opponent_gold_pos = state.gold_pos[self.opponent_team]
+            self.my_wiped = all(p.is_captured for p in self.mine)
+            self.their_wiped = all(p.is_captured for p in self.theirs)
+
+    def winner(self):
+        # check_terminal_state's order: gold carried home (team A's players come first), then wipe-outs.
+        # The turn limit only makes it a draw, which evaluates like an open position.
+        totals = self.totals
+        team_A_first = self.team == 'A'
+        if totals[6] and (team_A_first or not totals[7]): return self.team
+        if totals[7]: return self.opponent_team
+        if self.my_wiped and (team_A_first or not self.their_wiped): return self.opponent_team
+        if self.their_wiped: return self.team
+        return None
+
+    def score(self):
+        totals = self.totals
+        if totals[6] or totals[7] or self.my_wiped or self.their_wiped:
+            winner = self.winner()
+            if winner == self.team: return float('inf')
+            if winner == self.opponent_team: return float('-inf')
+        score = totals[3]
+        if self.my_gold_pos and totals[4]:
+            score += totals[4] * totals[5]
+        if totals[0] or totals[1] or totals[2]:
+            score -= totals[0] * 50 + totals[1] * 25 + totals[2] * (50 / 3)
+        return score
+
 class GreedyAgent(Agent):
-    def _manhattan_distance(self, pos1, pos2):
-        if not pos1 or not pos2: return float('inf')
-        return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
+    def __init__(self, team, max_branching=125, incremental=True):
+        super().__init__(team)
+        self.max_branching = max_branching
+        self.incremental = incremental
+        self._evaluator = None
 
     def evaluate_state(self, game: KabaddiGame):
-        score = 0
-        my_players = [p for p in game.state.players.values() if p.team == self.team]
-        opponent_team = 'B' if self.team == 'A' else 'A'
-        opponent_players = [p for p in game.state.players.values() if p.team == opponent_team]
-        my_gold_pos = game.state.gold_pos.get(self.team)
-        opponent_gold_pos = game.state.gold_pos.get(opponent_team)
+        stats = self.stats
+        if stats is None: return self._leaf_value(game)
+        start_time = time.perf_counter()
+        value = self._leaf_value(game)
+        stats.leaf_evals += 1
+        stats.time['evaluate'] += time.perf_counter() - start_time
+        return value
+
+    def _leaf_value(self, game):
+        evaluator = self._evaluator
+        if evaluator is not None and evaluator.game is game: return evaluator.score()
+        return self._evaluate(game)
+
+    @contextmanager
+    def _incremental_evaluation(self, game):
+        # Lets the searches below evaluate leaves incrementally while they make and unmake moves.
+        if not self.incremental or game.observer is not None:
+            yield
+            return
+        self._evaluator = game.observer = IncrementalEvaluator(game, self.team)
+        try:
+            yield
+        finally:
+            self._evaluator = game.observer = None
+
+    def _evaluate(self, game):
+        state = game.state
+        opponent_team = OPPONENT[self.team]
         winner = game.check_terminal_state()
         if winner == self.team: return float('inf')
         if winner == opponent_team: return float('-inf')
-        for player in my_players:
+        distance = state.grid_tables.distance
+        home_distance = state.grid_tables.home_distance[self.team]
+        enemy_territory = state.grid_tables.enemy_territory[self.team]
+        my_gold_pos = state.gold_pos[self.team]
+        opponent_gold_pos = state.gold_pos[opponent_team]
+        to_opponent_gold = distance[opponent_gold_pos] if opponent_gold_pos else None
+        opponent_positions = [p.pos for p in state.teams[opponent_team] if not p.is_captured]
+        opponent_cells = None
+        score = 0
+        active = 0
+        near = [0, 0, 0] # Opponents at distance 0, 1 and 2 from our raiders
+        for player in state.teams[self.team]:
             if player.is_captured:
                 score -= 1000
                 continue
+            active += 1
             if player.has_gold:
                 score += 500
-                my_home_territory_edge = game.state.half_way_x - 1 if self.team == 'A' else game.state.half_way_x
-                dist_to_home = abs(player.pos[0] - my_home_territory_edge)
-                score -= dist_to_home * 10
+                score -= home_distance[player.pos[0]] * 10
             elif opponent_gold_pos:
-                dist_to_gold = self._manhattan_distance(player.pos, opponent_gold_pos)
-                score -= dist_to_gold * 5
-            if my_gold_pos:
-                for opp in opponent_players:
-                    if not opp.is_captured:
-                        dist_to_our_gold = self._manhattan_distance(opp.pos, my_gold_pos)
-                        score += dist_to_our_gold
-            if game.state.is_in_enemy_territory(player):
-                for opp in opponent_players:
-                    if not opp.is_captured:
-                        dist_to_opp = self._manhattan_distance(player.pos, opp.pos)
+                score -= to_opponent_gold[player.pos] * 5
+            if enemy_territory[player.pos[0]]:
+                if len(opponent_positions) <= len(DANGER_OFFSETS):
+                    to_raider = distance[player.pos]
+                    for opp_pos in opponent_positions:
+                        dist_to_opp = to_raider[opp_pos]
                         if dist_to_opp < 3:
-                            score -= (50 / (dist_to_opp + 1))
+                            near[dist_to_opp] += 1
+                else:
+                    x, y = player.pos
+                    # Large teams: probe the squares within reach instead of every opponent.
+                    if opponent_cells is None: opponent_cells = Counter(opponent_positions)
+                    for dx, dy, dist_to_opp in DANGER_OFFSETS:
+                        near[dist_to_opp] += opponent_cells.get((x + dx, y + dy), 0)
+        if my_gold_pos and active:
+            to_my_gold = distance[my_gold_pos]
+            score += active * sum(to_my_gold[opp_pos] for opp_pos in opponent_positions)
+        if near[0] or near[1] or near[2]:
+            score -= near[0] * 50 + near[1] * 25 + near[2] * (50 / 3)
         return score
 
     def select_moves(self, game: KabaddiGame):
-        best_move_combination = {}
+        with self._incremental_evaluation(game):
+            return self._greedy_search(game)
+
+    def _greedy_search(self, game):
+        best_move = None
         best_score = float('-inf')
-        active_players = [p for p in game.state.players.values() if p.team == self.team and not p.is_captured]
-        if not active_players: return {}
-        player_moves_options = [game.get_valid_moves(p.id) for p in active_players]
-        move_combinations = list(itertools.product(*player_moves_options))
-        if not move_combinations: return {}
-        best_move_combination = {p.id: move for p, move in zip(active_players, move_combinations[0])}
-        for combination in move_combinations:
-            temp_game = game.clone()
-            current_moves = {p.id: move for p, move in zip(active_players, combination)}
-            temp_game.apply_moves(current_moves)
-            score = self.evaluate_state(temp_game)
-            if score > best_score:
+        for move in self._candidate_moves(game, self.team):
+            undo = game.apply_moves(move)
+            score = self.evaluate_state(game)
+            game.undo_moves(undo)
+            if best_move is None or score > best_score:
                 best_score = score
-                best_move_combination = current_moves
-        return best_move_combination
+                best_move = move
+            if self.stats is not None: self.stats.nodes += 1
+        return dict(best_move) if best_move else {}
+
+    def _candidate_moves(self, game, team, max_branching=None):
+        # Joint moves to search. Past max_branching, rank each player's single moves
+        # and keep the max_branching joint moves with the best combined rank.
+        max_branching = max_branching or self.max_branching
+        players = [p for p in game.state.teams[team] if not p.is_captured]
+        options = {p.id: game.get_valid_moves(p.id) for p in players}
+        if max_branching is None or math.prod(len(o) for o in options.values()) <= max_branching:
+            return game.joint_moves(team)
+        sign = 1 if team == self.team else -1
+        for player in players:
+            scored = []
+            for pos in options[player.id]:
+                undo = game.apply_moves(((player.id, pos),))
+                scored.append((sign * self.evaluate_state(game), pos))
+                game.undo_moves(undo)
+            scored.sort(key=lambda s: s[0], reverse=True)
+            options[player.id] = [pos for _, pos in scored]
+        return game.ranked_joint_moves(team, options, max_branching)
+
+class TranspositionTable:
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, value, flag, move):
+        old = self.entries.get(key)
+        if old is not None and old[0] > depth: return
+        self.entries[key] = (depth, value, flag, move)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
 
 class AlphaBetaAgent(GreedyAgent):
-    def __init__(self, team, depth=2):
-        super().__init__(team)
+    def __init__(self, team, depth=2, tt_size=200000, time_limit=None, max_depth=None, max_branching=125, tablebase=None, incremental=True):
+        super().__init__(team, max_branching, incremental)
         self.depth = depth
+        self.tablebase = load_tablebase(tablebase) if isinstance(tablebase, str) else tablebase
+        self.tt = TranspositionTable(tt_size) if tt_size else None
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self._search_depth = depth
+        self._deadline = None
+        self._timed_out = False
+        self._killers = {}
+        self._history = {}
 
     def select_moves(self, game: KabaddiGame):
-        return self._alphabeta_search(game)
+        moves = self.tablebase.select_moves(game) if self.tablebase else None
+        if moves: return moves
+        with self._incremental_evaluation(game):
+            return self._alphabeta_search(game)
 
     def _alphabeta_search(self, game: KabaddiGame):
-        best_move_combination = {}
-        best_score = float('-inf')
-        active_players = [p for p in game.state.players.values() if p.team == self.team and not p.is_captured]
-        if not active_players: return {}
-        player_moves_options = [game.get_valid_moves(p.id) for p in active_players]
-        move_combinations = list(itertools.product(*player_moves_options))
+        move_combinations = list(self._candidate_moves(game, self.team))
         if not move_combinations: return {}
-        best_move_combination = {p.id: move for p, move in zip(active_players, random.choice(move_combinations))}
+        best_combination = random.choice(move_combinations)
+        self._killers = {}
+        self._history = {}
+        self._timed_out = False
+        if self.time_limit is None:
+            combination, _, _ = self._search_root(game, move_combinations, self.depth)
+            if combination is not None: best_combination = combination
+        else:
+            self._deadline = time.time() + self.time_limit
+            max_depth = self.max_depth or max(1, game.turn_limit - game.state.turn)
+            for depth in range(1, max_depth + 1):
+                combination, best_score, scores = self._search_root(game, move_combinations, depth)
+                # A partial iteration still searched its first moves (last iteration's best) in full.
+                if combination is not None: best_combination = combination
+                if self._timed_out or abs(best_score) == float('inf'): break
+                move_combinations.sort(key=lambda c: scores.get(c, float('-inf')), reverse=True)
+            self._deadline = None
+        return dict(best_combination)
+
+    def _search_root(self, game, move_combinations, depth):
+        self._search_depth = depth
+        best_combination = None
+        best_score = float('-inf')
+        scores = {}
         alpha = float('-inf')
         beta = float('inf')
         for combination in move_combinations:
-            temp_game = game.clone()
-            current_moves = {p.id: move for p, move in zip(active_players, combination)}
-            temp_game.apply_moves(current_moves)
-            score = self._min_value(temp_game, self.depth - 1, alpha, beta)
+            undo = game.apply_moves(combination)
+            score = self._min_value(game, depth - 1, alpha, beta)
+            game.undo_moves(undo)
+            if self._timed_out: break
+            scores[combination] = score
             if score > best_score:
                 best_score = score
-                best_move_combination = current_moves
+                best_combination = combination
             alpha = max(alpha, best_score)
-        return best_move_combination
+        key = self._tt_key(game, depth, maximizing=True)
+        if key is not None and best_combination is not None and not self._timed_out:
+            self.tt.store(key, depth, best_score, TranspositionTable.EXACT, best_combination)
+        return best_combination, best_score, scores
+
+    def _out_of_time(self):
+        if self._deadline is not None and time.time() >= self._deadline:
+            self._timed_out = True
+        return self._timed_out
+
+    def _tt_key(self, game, depth, maximizing):
+        # Entries are only shared while the turn limit cannot cut the subtree short.
+        if self.tt is None or game.state.turn + depth > game.turn_limit: return None
+        return game.state.zobrist if maximizing else game.state.zobrist ^ game.state.zobrist_keys.side
+
+    def _tt_probe(self, key, depth, alpha, beta, horizon):
+        # horizon is how many turns the game has left: an entry searched deeper than
+        # that, further from the limit, saw lines this position cannot play out.
+        entry = self.tt.get(key) if key is not None else None
+        if entry is None: return None, alpha, beta, None
+        entry_depth, value, flag, move = entry
+        if depth <= entry_depth <= horizon:
+            if flag == TranspositionTable.EXACT: return value, alpha, beta, move
+            if flag == TranspositionTable.LOWER: alpha = max(alpha, value)
+            else: beta = min(beta, value)
+            if alpha >= beta: return value, alpha, beta, move
+        return None, alpha, beta, move
+
+    def _tt_store(self, key, depth, value, alpha, beta, move):
+        if key is None: return
+        if value <= alpha: flag = TranspositionTable.UPPER
+        elif value >= beta: flag = TranspositionTable.LOWER
+        else: flag = TranspositionTable.EXACT
+        self.tt.store(key, depth, value, flag, move)
+
+    def _ordered_combinations(self, game, team, tt_move, depth, maximizing):
+        start_time = time.perf_counter() if self.stats is not None else None
+        move_combinations = list(self._candidate_moves(game, team))
+        if self._history:
+            history = self._history
+            move_combinations.sort(key=lambda c: history.get((maximizing, c), 0), reverse=True)
+        front = []
+        for move in (tt_move, *self._killers.get(self._search_depth - depth, ())):
+            if move is not None and move not in front and move in move_combinations:
+                move_combinations.remove(move)
+                front.append(move)
+        if start_time is not None: self.stats.time['ordering'] += time.perf_counter() - start_time
+        return front + move_combinations
+
+    def _count_node(self, depth):
+        stats = self.stats
+        stats.nodes += 1
+        stats.max_depth = max(stats.max_depth, self._search_depth - depth)
+
+    def _record_cutoff(self, combination, depth, maximizing):
+        if self.stats is not None: self.stats.cutoffs += 1
+        killers = self._killers.setdefault(self._search_depth - depth, [])
+        if combination not in killers:
+            killers.insert(0, combination)
+            del killers[2:]
+        key = (maximizing, combination)
+        self._history[key] = self._history.get(key, 0) + depth * depth
 
     def _min_value(self, game, depth, alpha, beta):
+        if self.stats is not None: self._count_node(depth)
         if depth == 0 or game.check_terminal_state() is not None:
             return self.evaluate_state(game)
+        if self._out_of_time(): return 0
         value = float('inf')
-        opponent_team = 'B' if self.team == 'A' else 'A'
-        active_players = [p for p in game.state.players.values() if p.team == opponent_team and not p.is_captured]
+        opponent_team = OPPONENT[self.team]
+        active_players = [p for p in game.state.teams[opponent_team] if not p.is_captured]
         if not active_players: return self.evaluate_state(game)
-        player_moves_options = [game.get_valid_moves(p.id) for p in active_players]
-        move_combinations = list(itertools.product(*player_moves_options))
-        for combination in move_combinations:
-            temp_game = game.clone()
-            current_moves = {p.id: move for p, move in zip(active_players, combination)}
-            temp_game.apply_moves(current_moves)
-            value = min(value, self._max_value(temp_game, depth - 1, alpha, beta))
-            if value <= alpha: return value # Prune
+        key = self._tt_key(game, depth, maximizing=False)
+        alpha_orig, beta_orig = alpha, beta
+        cached, alpha, beta, tt_move = self._tt_probe(key, depth, alpha, beta, game.turn_limit - game.state.turn)
+        if cached is not None: return cached
+        best_combination = None
+        for combination in self._ordered_combinations(game, opponent_team, tt_move, depth, False):
+            undo = game.apply_moves(combination)
+            score = self._max_value(game, depth - 1, alpha, beta)
+            game.undo_moves(undo)
+            if self._timed_out: return value
+            if score < value:
+                value = score
+                best_combination = combination
+            if value <= alpha: # Prune
+                self._record_cutoff(combination, depth, False)
+                break
             beta = min(beta, value)
+        self._tt_store(key, depth, value, alpha_orig, beta_orig, best_combination)
         return value
 
     def _max_value(self, game, depth, alpha, beta):
+        if self.stats is not None: self._count_node(depth)
         if depth == 0 or game.check_terminal_state() is not None:
             return self.evaluate_state(game)
+        if self._out_of_time(): return 0
         value = float('-inf')
-        active_players = [p for p in game.state.players.values() if p.team == self.team and not p.is_captured]
+        active_players = [p for p in game.state.teams[self.team] if not p.is_captured]
         if not active_players: return self.evaluate_state(game)
-        player_moves_options = [game.get_valid_moves(p.id) for p in active_players]
-        move_combinations = list(itertools.product(*player_moves_options))
-        for combination in move_combinations:
-            temp_game = game.clone()
-            current_moves = {p.id: move for p, move in zip(active_players, combination)}
-            temp_game.apply_moves(current_moves)
-            value = max(value, self._min_value(temp_game, depth - 1, alpha, beta))
-            if value >= beta: return value # Prune
+        key = self._tt_key(game, depth, maximizing=True)
+        alpha_orig, beta_orig = alpha, beta
+        cached, alpha, beta, tt_move = self._tt_probe(key, depth, alpha, beta, game.turn_limit - game.state.turn)
+        if cached is not None: return cached
+        best_combination = None
+        for combination in self._ordered_combinations(game, self.team, tt_move, depth, True):
+            undo = game.apply_moves(combination)
+            score = self._min_value(game, depth - 1, alpha, beta)
+            game.undo_moves(undo)
+            if self._timed_out: return value
+            if score > value:
+                value = score
+                best_combination = combination
+            if value >= beta: # Prune
+                self._record_cutoff(combination, depth, True)
+                break
             alpha = max(alpha, value)
+        self._tt_store(key, depth, value, alpha_orig, beta_orig, best_combination)
         return value
 
 class HybridAlphaBetaAgent(AlphaBetaAgent):
     def select_moves(self, game: KabaddiGame):
         if game.game_mode == 'simultaneous':
-            return GreedyAgent(self.team).select_moves(game)
+            return GreedyAgent.select_moves(self, game)
         else:
             return super().select_moves(game)
 
-class MCTSNode:
-    def __init__(self, game: KabaddiGame, parent=None, move=None):
-        self.game = game
-        self.parent = parent
-        self.move = move
-        self.children = []
-        self.wins = 0
-        self.visits = 0
-        self.unexplored_moves = self._get_all_possible_moves()
-
-    def _get_all_possible_moves(self):
-        team_to_move = self.parent.game.state.current_player_team if self.parent else self.game.state.current_player_team
-        active_players = [p for p in self.game.state.players.values() if p.team == team_to_move and not p.is_captured]
-        if not active_players: return []
-        player_moves_options = [self.game.get_valid_moves(p.id) for p in active_players]
-        move_combinations = list(itertools.product(*player_moves_options))
-        return [{p.id: move for p, move in zip(active_players, combo)} for combo in move_combinations]
-
-    def select_child(self, exploration_constant=1.41):
-        best_score = -1
-        best_child = None
-        for child in self.children:
-            if child.visits == 0: return child
-            exploit = child.wins / child.visits
-            explore = exploration_constant * math.sqrt(math.log(self.visits) / child.visits)
-            score = exploit + explore
-            if score > best_score:
-                best_score = score
-                best_child = child
-        return best_child
-
-    def expand(self):
-        if not self.unexplored_moves: return None
-        move = self.unexplored_moves.pop()
-        new_game = self.game.clone()
-        new_game.apply_moves(move)
-        if new_game.game_mode == 'turn_by_turn':
-            new_game.state.current_player_team = 'B' if self.game.state.current_player_team == 'A' else 'A'
-        child_node = MCTSNode(new_game, parent=self, move=move)
-        self.children.append(child_node)
-        return child_node
-
-    def simulate(self):
-        temp_game = self.game.clone()
+MATRIX_WIN = 1e6
+
+def solve_matrix_game(payoff, iterations=200):
+    # Zero-sum game, rows maximise. Returns the row player's mixed strategy and the game value.
+    maximin = payoff.min(axis=1)
+    minimax = payoff.max(axis=0)
+    if maximin.max() >= minimax.min():
+        strategy = np.zeros(payoff.shape[0])
+        strategy[maximin.argmax()] = 1.0
+        return strategy, float(maximin.max())
+    # No saddle point: fictitious play, each side best-responding to the other's mix so far.
+    row_counts = np.zeros(payoff.shape[0])
+    row_totals = np.zeros(payoff.shape[1])
+    column_totals = np.zeros(payoff.shape[0])
+    row = int(maximin.argmax())
+    for _ in range(iterations):
+        row_counts[row] += 1
+        row_totals += payoff[row]
+        column_totals += payoff[:, row_totals.argmin()]
+        row = int(column_totals.argmax())
+    lower = row_totals.min() / iterations
+    upper = column_totals.max() / iterations
+    return row_counts / iterations, float(lower + upper) / 2
+
+class MatrixGameAgent(AlphaBetaAgent):
+    # Simultaneous mode: both teams choose at once, so every node is a zero-sum matrix
+    # game over (our joint move, their joint move) whose entries are the child values.
+    # Turn-by-turn games are searched by alpha-beta as usual.
+    def __init__(self, team, depth=2, tt_size=200000, time_limit=None, max_depth=None, max_branching=125, tablebase=None, matrix_branching=9, iterations=200, incremental=True):
+        super().__init__(team, depth, tt_size, time_limit, max_depth, max_branching, tablebase, incremental)
+        self.matrix_branching = matrix_branching
+        self.iterations = iterations
+        self.matrix_cache = TranspositionTable(tt_size) if tt_size else None
+
+    def select_moves(self, game: KabaddiGame):
+        if game.game_mode != 'simultaneous':
+            return super().select_moves(game)
+        if game.check_terminal_state() is not None: return {}
+        with self._incremental_evaluation(game):
+            my_moves, strategy, value = self._solve_node(game, self.depth)
+        self._matrix_store(game, self.depth, value)
+        return dict(random.choices(my_moves, weights=strategy)[0])
+
+    def _solve_node(self, game, depth):
+        opponent_team = OPPONENT[self.team]
+        my_moves = list(self._candidate_moves(game, self.team, self.matrix_branching))
+        their_moves = list(self._candidate_moves(game, opponent_team, self.matrix_branching))
+        if not my_moves: my_moves = [()]
+        if not their_moves: their_moves = [()]
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += len(my_moves) * len(their_moves)
+            stats.max_depth = max(stats.max_depth, self.depth - depth + 1)
+        payoff = np.empty((len(my_moves), len(their_moves)))
+        for i, mine in enumerate(my_moves):
+            for j, theirs in enumerate(their_moves):
+                # A's moves go first, as in run_game_loop's {**moves_A, **moves_B}.
+                undo = game.apply_moves(mine + theirs if self.team == 'A' else theirs + mine)
+                payoff[i, j] = self._matrix_value(game, depth - 1)
+                game.undo_moves(undo)
+        start_time = time.perf_counter() if stats is not None else None
+        strategy, value = solve_matrix_game(payoff, self.iterations)
+        if stats is not None: stats.time['solve'] += time.perf_counter() - start_time
+        return my_moves, strategy, value
+
+    def _matrix_value(self, game, depth):
+        if depth == 0 or game.check_terminal_state() is not None:
+            return max(-MATRIX_WIN, min(MATRIX_WIN, self.evaluate_state(game)))
+        key = self._matrix_key(game, depth)
+        entry = self.matrix_cache.get(key) if key is not None else None
+        if entry is not None and depth <= entry[0] <= game.turn_limit - game.state.turn: return entry[1]
+        _, _, value = self._solve_node(game, depth)
+        self._matrix_store(game, depth, value)
+        return value
+
+    def _matrix_key(self, game, depth):
+        if self.matrix_cache is None or game.state.turn + depth > game.turn_limit: return None
+        return game.state.zobrist
+
+    def _matrix_store(self, game, depth, value):
+        key = self._matrix_key(game, depth)
+        if key is not None:
+            self.matrix_cache.store(key, depth, value, TranspositionTable.EXACT, None)
+
+TEAMS = ('A', 'B')
+TEAM_CODES = {'A': 0, 'B': 1}
+
+class MCTSTree:
+    # One row per node in parallel arrays. A node's children occupy a contiguous
+    # block starting at first_child, and moves are indices into a shared table.
+    # Nodes keep only their state key; positions are rebuilt by replaying moves
+    # from the root.
+    _FIELDS = (
+        ('visits', np.int32, 0), ('wins', np.int32, 0), ('parent', np.int32, -1),
+        ('first_child', np.int32, -1), ('num_children', np.int32, 0), ('move', np.int32, -1),
+        ('zobrist', np.uint64, 0), ('turn', np.int32, -1), ('team', np.int8, 0), ('expanded', np.bool_, False),
+    )
+
+    def __init__(self, game: KabaddiGame = None, capacity=1024):
+        for name, dtype, fill in self._FIELDS:
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+        self.capacity = capacity
+        self.size = 0
+        self.moves = []
+        self._move_ids = {}
+        self.simultaneous = game is not None and game.game_mode == 'simultaneous'
+        self.root = 0
+        if game is not None:
+            self._allocate(1)
+            self.team[0] = TEAM_CODES[game.state.current_player_team]
+            self._set_key(0, game)
+
+    def __len__(self):
+        return self.size
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name, _, _ in self._FIELDS)
+
+    def _allocate(self, count):
+        # Sizes stay Python ints: counts often come out of the int32 arrays, and
+        # self.size feeds SearchStats, which is written out as JSON.
+        count = int(count)
+        start = self.size
+        if start + count > self.capacity:
+            capacity = max(2 * self.capacity, start + count)
+            for name, dtype, fill in self._FIELDS:
+                grown = np.full(capacity, fill, dtype=dtype)
+                grown[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, grown)
+            self.capacity = capacity
+        self.size += count
+        return start
+
+    def _intern(self, move):
+        move_id = self._move_ids.get(move)
+        if move_id is None:
+            move_id = self._move_ids[move] = len(self.moves)
+            self.moves.append(move)
+        return move_id
+
+    def _set_key(self, node, game):
+        self.zobrist[node] = game.state.zobrist
+        self.turn[node] = game.state.turn
+
+    def key(self, node):
+        return int(self.zobrist[node]), int(self.turn[node]), TEAMS[self.team[node]]
+
+    def children(self, node):
+        first = self.first_child[node]
+        return range(first, first + self.num_children[node])
+
+    def expand(self, node, game, max_branching=None):
+        # Children are allocated the first time the search stands on the node.
+        self.expanded[node] = True
+        if game.check_terminal_state() is not None: return
+        team = TEAMS[self.team[node]]
+        moves = list(game.sample_joint_moves(team, max_branching) if max_branching else game.joint_moves(team))
+        if not moves: return
+        first = self._allocate(len(moves))
+        block = slice(first, first + len(moves))
+        self.first_child[node] = first
+        self.num_children[node] = len(moves)
+        self.parent[block] = node
+        self.move[block] = [self._intern(move) for move in moves]
+        self.team[block] = self.team[node] if self.simultaneous else 1 - self.team[node]
+
+    def select_child(self, node, exploration_constant=1.41):
+        first = self.first_child[node]
+        visits = self.visits[first:first + self.num_children[node]]
+        unvisited = np.flatnonzero(visits == 0)
+        if unvisited.size: return first + int(unvisited[0])
+        exploit = self.wins[first:first + self.num_children[node]] / visits
+        explore = exploration_constant * np.sqrt(math.log(self.visits[node]) / visits)
+        return first + int((exploit + explore).argmax())
+
+    def descend(self, child, game):
+        undo = game.apply_moves(self.moves[self.move[child]])
+        game.state.current_player_team = TEAMS[self.team[child]]
+        if self.turn[child] < 0:
+            self._set_key(child, game)
+        return undo
+
+    def simulate(self, game):
         sim_agent_A = RandomAgent('A')
         sim_agent_B = RandomAgent('B')
-        while temp_game.check_terminal_state() is None:
-            if temp_game.game_mode == 'turn_by_turn':
-                current_agent = sim_agent_A if temp_game.state.current_player_team == 'A' else sim_agent_B
-                moves = current_agent.select_moves(temp_game)
+        team = game.state.current_player_team
+        history = []
+        while game.check_terminal_state() is None:
+            if game.game_mode == 'turn_by_turn':
+                current_agent = sim_agent_A if game.state.current_player_team == 'A' else sim_agent_B
+                moves = current_agent.select_moves(game)
                 if not moves: break
-                temp_game.apply_moves(moves)
-                temp_game.state.current_player_team = 'B' if temp_game.state.current_player_team == 'A' else 'A'
+                history.append(game.apply_moves(moves))
+                game.state.current_player_team = OPPONENT[game.state.current_player_team]
             else:
-                moves_A = sim_agent_A.select_moves(temp_game)
-                moves_B = sim_agent_B.select_moves(temp_game)
+                moves_A = sim_agent_A.select_moves(game)
+                moves_B = sim_agent_B.select_moves(game)
                 if not moves_A and not moves_B: break
                 all_moves = {**moves_A, **moves_B}
-                temp_game.apply_moves(all_moves)
-        return temp_game.check_terminal_state()
-
-    def backpropagate(self, result):
-        node = self
-        while node is not None:
-            node.visits += 1
-            team_that_made_move = node.parent.game.state.current_player_team if node.parent else self.game.state.current_player_team
-            if team_that_made_move == result:
-                node.wins += 1
-            node = node.parent
+                history.append(game.apply_moves(all_moves))
+        winner = game.check_terminal_state()
+        for undo in reversed(history):
+            game.undo_moves(undo)
+        game.state.current_player_team = team
+        return winner
+
+    def backpropagate(self, node, result):
+        result_code = TEAM_CODES.get(result)
+        while node >= 0:
+            self.visits[node] += 1
+            parent = self.parent[node]
+            team_that_made_move = self.team[parent] if parent >= 0 else self.team[node]
+            if team_that_made_move == result_code:
+                self.wins[node] += 1
+            node = parent
+
+    def search(self, game, deadline, max_branching=None, rollout=None, stats=None):
+        root_team = TEAMS[self.team[self.root]]
+        rollouts = 0
+        size = self.size
+        while time.time() < deadline:
+            if stats is not None: phase_start = time.perf_counter()
+            node = self.root
+            path = []
+            while True:
+                if not self.expanded[node]:
+                    self.expand(node, game, max_branching)
+                if not self.num_children[node]: break
+                child = self.select_child(node)
+                path.append(self.descend(child, game))
+                node = child
+                if self.visits[node] == 0: break
+            if stats is not None: phase_start = self._phase(stats, 'select', phase_start)
+            winners = rollout(game) if rollout else [self.simulate(game)]
+            if stats is not None: phase_start = self._phase(stats, 'rollout', phase_start)
+            for winner in winners:
+                if winner:
+                    self.backpropagate(node, winner)
+            rollouts += len(winners)
+            for undo in reversed(path):
+                game.undo_moves(undo)
+            game.state.current_player_team = root_team
+            if stats is not None:
+                self._phase(stats, 'backpropagate', phase_start)
+                stats.iterations += 1
+                stats.max_depth = max(stats.max_depth, len(path))
+        if stats is not None:
+            stats.rollouts += rollouts
+            stats.nodes += self.size - size
+        return rollouts
+
+    @staticmethod
+    def _phase(stats, phase, start_time):
+        now = time.perf_counter()
+        stats.time[phase] += now - start_time
+        return now
+
+    def find(self, key, max_depth=2):
+        level = [self.root]
+        for _ in range(max_depth + 1):
+            for node in level:
+                if self.turn[node] >= 0 and self.key(node) == key:
+                    return node
+            level = [child for node in level for child in self.children(node)]
+        return None
+
+    def subtree(self, node):
+        # Copy the subtree under node into a fresh, compact tree; the rest is freed with self.
+        tree = MCTSTree(capacity=max(1024, self.size))
+        tree.simultaneous = self.simultaneous
+        tree._allocate(1)
+        self._copy_rows(tree, [node], 0)
+        queue = [(node, 0)]
+        while queue:
+            old, new = queue.pop()
+            count = int(self.num_children[old])
+            if not count: continue
+            first = tree._allocate(count)
+            old_children = list(self.children(old))
+            self._copy_rows(tree, old_children, first)
+            tree.first_child[new] = first
+            tree.parent[first:first + count] = new
+            queue.extend(zip(old_children, range(first, first + count)))
+        tree.parent[0] = -1
+        return tree
+
+    def _copy_rows(self, tree, rows, start):
+        block = slice(start, start + len(rows))
+        for name, _, _ in self._FIELDS:
+            getattr(tree, name)[block] = getattr(self, name)[rows]
+        tree.move[block] = [tree._intern(self.moves[m]) if m >= 0 else -1 for m in self.move[rows]]
+
+    def root_children(self):
+        return [(self.moves[self.move[c]], int(self.visits[c]), int(self.wins[c])) for c in self.children(self.root)]
+
+def _root_parallel_worker(game, team, deadline, max_branching, seed):
+    random.seed(seed)
+    game.state.current_player_team = team
+    tree = MCTSTree(game)
+    rollouts = tree.search(game, deadline, max_branching)
+    return tree.root_children(), rollouts
+
+def _batch_rollouts(game, count, seed):
+    return BatchSimulator.from_game(game, count, seed=seed).run()
 
 class MCTSAgent(Agent):
-    def __init__(self, team, time_limit=1.0):
+    def __init__(self, team, time_limit=1.0, max_branching=125, parallel=None, workers=None, leaf_batch=64, reuse_tree=True, tablebase=None):
         super().__init__(team)
+        if parallel not in (None, 'root', 'leaf'):
+            raise ValueError("parallel must be None, 'root' or 'leaf'")
         self.time_limit = time_limit
+        self.max_branching = max_branching
+        self.parallel = parallel
+        self.workers = workers or os.cpu_count() or 1
+        self.leaf_batch = leaf_batch
+        self.reuse_tree = reuse_tree
+        self.tablebase = load_tablebase(tablebase) if isinstance(tablebase, str) else tablebase
+        self.last_rollouts = 0
+        self.last_reused_visits = 0
+        self._tree = None
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __del__(self):
+        self.close()
 
     def select_moves(self, game: KabaddiGame):
-        root = MCTSNode(game)
-        root.game.state.current_player_team = self.team
-        start_time = time.time()
-        while time.time() - start_time < self.time_limit:
-            node = root
-            while not node.unexplored_moves and node.children:
-                node = node.select_child()
-            if node.unexplored_moves:
-                node = node.expand()
-            if node:
-                winner = node.simulate()
-                if winner:
-                    node.backpropagate(winner)
-        if not root.children: return RandomAgent(self.team).select_moves(game)
-        best_child = max(root.children, key=lambda c: c.visits)
-        return best_child.move
+        moves = self.tablebase.select_moves(game) if self.tablebase else None
+        if moves: return moves
+        if self.parallel == 'root':
+            return self._root_parallel_search(game)
+        original_team = game.state.current_player_team
+        game.state.current_player_team = self.team
+        tree = self._reuse_tree(game) or MCTSTree(game)
+        self.last_reused_visits = int(tree.visits[tree.root])
+        rollout = self._leaf_rollouts if self.parallel == 'leaf' else None
+        self.last_rollouts = tree.search(game, time.time() + self.time_limit, self.max_branching, rollout, self.stats)
+        game.state.current_player_team = original_team
+        self._tree = tree if self.reuse_tree else None
+        children = tree.children(tree.root)
+        if not children: return RandomAgent(self.team).select_moves(game)
+        best_child = children[int(tree.visits[children.start:children.stop].argmax())]
+        return dict(tree.moves[tree.move[best_child]])
+
+    def _reuse_tree(self, game):
+        # Re-root at the node for the position we now face: our move and the reply
+        # put it at most two plies below the previous root. Anything else is dropped.
+        previous, self._tree = self._tree, None
+        if previous is None: return None
+        node = previous.find((game.state.zobrist, game.state.turn, self.team))
+        if node is None: return None
+        return previous.subtree(node)
 
+    def _root_parallel_search(self, game):
+        # Independent trees, one per worker, merged on root child visit counts.
+        deadline = time.time() + self.time_limit
+        futures = [
+            self._pool().submit(_root_parallel_worker, game, self.team, deadline, self.max_branching, random.getrandbits(32))
+            for _ in range(self.workers)
+        ]
+        visits = {}
+        self.last_rollouts = 0
+        for future in futures:
+            children, rollouts = future.result()
+            self.last_rollouts += rollouts
+            for move, child_visits, _ in children:
+                visits[move] = visits.get(move, 0) + child_visits
+        if self.stats is not None:
+            # Each worker gets its own copy of the game and runs one playout per iteration.
+            self.stats.clones += len(futures)
+            self.stats.iterations += self.last_rollouts
+            self.stats.rollouts += self.last_rollouts
+        if not visits: return RandomAgent(self.team).select_moves(game)
+        return dict(max(visits, key=visits.get))
 
+    def _leaf_rollouts(self, game):
+        # One batch of playouts from the selected leaf, vectorized and split over the workers.
+        if self.workers == 1:
+            return _batch_rollouts(game, self.leaf_batch, random.getrandbits(32))
+        chunks = [self.leaf_batch // self.workers + (i < self.leaf_batch % self.workers) for i in range(self.workers)]
+        futures = [self._pool().submit(_batch_rollouts, game, size, random.getrandbits(32)) for size in chunks if size]
+        if self.stats is not None: self.stats.clones += len(futures)
+        return [winner for future in futures for winner in future.result()]
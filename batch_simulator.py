@@ -0,0 +1,163 @@
+import argparse
+import time
+import numpy as np
+from game_environment import KabaddiGame
+
+# Same order as KabaddiGame.get_valid_moves: stay, down, up, right, left.
+DIRECTIONS = np.array([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)], dtype=np.int16)
+TEAMS = ('A', 'B')
+UNDECIDED, WIN_A, WIN_B, DRAW = -1, 0, 1, 2
+RESULT_NAMES = {WIN_A: 'A', WIN_B: 'B', DRAW: 'draw'}
+
+# Plays N RandomAgent-vs-RandomAgent games at once: every active player of the
+# moving side picks uniformly among its valid moves, then pickups, captures and
+# the terminal check follow KabaddiGame.apply_moves and check_terminal_state.
+class BatchSimulator:
+    def __init__(self, num_games, game_mode='turn_by_turn', turn_limit=100, grid_size=(10, 10), team_size=2, start_layout=None, seed=None, record=False):
+        template = KabaddiGame(game_mode='turn_by_turn', turn_limit=turn_limit, grid_size=grid_size, team_size=team_size, start_layout=start_layout)
+        self._load(template, num_games, game_mode, seed, record)
+
+    @classmethod
+    def from_game(cls, game: KabaddiGame, num_games, seed=None, record=False):
+        simulator = cls.__new__(cls)
+        simulator._load(game, num_games, game.game_mode, seed, record)
+        return simulator
+
+    def _load(self, game, num_games, game_mode, seed, record):
+        state = game.state
+        players = state.player_list
+        self.num_games = num_games
+        self.grid_size = state.grid_size
+        self.half_way_x = state.half_way_x
+        self.turn_limit = game.turn_limit
+        self.player_ids = [p.id for p in players]
+        self.team_of = np.array([TEAMS.index(p.team) for p in players], dtype=np.int8)
+        self.opposing = self.team_of[:, None] != self.team_of[None, :]
+        default_gold = {'A': (0, state.grid_size[1] // 2), 'B': (state.grid_size[0] - 1, state.grid_size[1] // 2)}
+        self.gold_cell = np.array([state.gold_pos[t] or default_gold[t] for t in TEAMS], dtype=np.int16)
+
+        self.pos = np.tile(np.array([p.pos for p in players], dtype=np.int16), (num_games, 1, 1))
+        self.has_gold = np.tile(np.array([p.has_gold for p in players]), (num_games, 1))
+        self.captured = np.tile(np.array([p.is_captured for p in players]), (num_games, 1))
+        self.gold_present = np.tile(np.array([state.gold_pos[t] is not None for t in TEAMS]), (num_games, 1))
+        self.turn = np.full(num_games, state.turn, dtype=np.int32)
+        self.current_team = np.full(num_games, TEAMS.index(state.current_player_team), dtype=np.int8)
+        if isinstance(game_mode, str):
+            self.simultaneous = np.full(num_games, game_mode == 'simultaneous')
+        else:
+            self.simultaneous = np.array([mode == 'simultaneous' for mode in game_mode])
+        self.winner = np.full(num_games, UNDECIDED, dtype=np.int8)
+        self.rng = np.random.default_rng(seed)
+        self.history = [] if record else None
+        self.elapsed = 0.0
+        self._check_terminal(np.arange(num_games))
+
+    @property
+    def done(self):
+        return self.winner != UNDECIDED
+
+    @property
+    def games_per_second(self):
+        return self.num_games / self.elapsed if self.elapsed else float('inf')
+
+    def _enemy_territory(self, pos):
+        return np.where(self.team_of == 0, pos[..., 0] >= self.half_way_x, pos[..., 0] < self.half_way_x)
+
+    def step(self):
+        live = np.nonzero(self.winner == UNDECIDED)[0]
+        if live.size == 0: return
+        pos = self.pos[live]
+        captured = self.captured[live]
+        has_gold = self.has_gold[live]
+        gold_present = self.gold_present[live]
+
+        movers = ~captured & (self.simultaneous[live, None] | (self.team_of[None, :] == self.current_team[live, None]))
+        candidates = pos[:, :, None, :] + DIRECTIONS[None, None, :, :]
+        valid = (
+            (candidates[..., 0] >= 0) & (candidates[..., 0] < self.grid_size[0])
+            & (candidates[..., 1] >= 0) & (candidates[..., 1] < self.grid_size[1])
+        )
+        picks = (self.rng.random(valid.shape[:2]) * valid.sum(axis=-1)).astype(np.int64)
+        choice = (np.cumsum(valid, axis=-1) > picks[..., None]).argmax(axis=-1)
+        index = np.broadcast_to(choice[:, :, None, None], choice.shape + (1, 2))
+        chosen = np.take_along_axis(candidates, index, axis=2)[:, :, 0, :]
+        pos = np.where(movers[..., None], chosen, pos)
+        if self.history is not None:
+            self.history.append((live, pos.copy(), movers))
+
+        # Players are resolved in order so the first teammate on the gold takes it.
+        for p, team in enumerate(self.team_of):
+            other = 1 - team
+            pickup = (
+                ~captured[:, p] & ~has_gold[:, p] & gold_present[:, other]
+                & (pos[:, p, 0] == self.gold_cell[other, 0]) & (pos[:, p, 1] == self.gold_cell[other, 1])
+            )
+            has_gold[pickup, p] = True
+            gold_present[pickup, other] = False
+
+        active = ~captured
+        same_square = (pos[:, :, None, 0] == pos[:, None, :, 0]) & (pos[:, :, None, 1] == pos[:, None, :, 1])
+        contested = (same_square & self.opposing[None] & active[:, None, :]).any(axis=-1)
+        captured |= contested & active & self._enemy_territory(pos)
+
+        self.pos[live] = pos
+        self.captured[live] = captured
+        self.has_gold[live] = has_gold
+        self.gold_present[live] = gold_present
+        self.turn[live] += 1
+        self.current_team[live] = np.where(self.simultaneous[live], self.current_team[live], 1 - self.current_team[live])
+        self._check_terminal(live)
+
+    def _check_terminal(self, games):
+        pos = self.pos[games]
+        captured = self.captured[games]
+        carrier_home = self.has_gold[games] & ~self._enemy_territory(pos)
+        winner = np.full(games.size, UNDECIDED, dtype=np.int8)
+        out_A = captured[:, self.team_of == 0].all(axis=1)
+        out_B = captured[:, self.team_of == 1].all(axis=1)
+        winner[self.turn[games] >= self.turn_limit] = DRAW
+        winner[out_A] = WIN_B
+        winner[out_B & ~out_A] = WIN_A
+        # A carrier reaching home outranks eliminations, first player in order first.
+        scored = carrier_home.any(axis=1)
+        winner[scored] = self.team_of[carrier_home.argmax(axis=1)][scored]
+        self.winner[games] = winner
+
+    def run(self):
+        start_time = time.time()
+        while not self.done.all():
+            self.step()
+        self.elapsed += time.time() - start_time
+        return self.results()
+
+    def results(self):
+        return [RESULT_NAMES.get(w) for w in self.winner]
+
+    def win_counts(self):
+        return {name: int((self.winner == code).sum()) for code, name in RESULT_NAMES.items()}
+
+    def moves_for(self, game_index):
+        if self.history is None:
+            raise ValueError("Simulator was created without record=True")
+        moves = []
+        for live, pos, movers in self.history:
+            row = np.searchsorted(live, game_index)
+            if row == live.size or live[row] != game_index: continue
+            moves.append({
+                self.player_ids[p]: tuple(int(c) for c in pos[row, p])
+                for p in range(len(self.player_ids)) if movers[row, p]
+            })
+        return moves
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run random-vs-random Kabaddi games in a NumPy batch.")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--mode', default='turn_by_turn', choices=['turn_by_turn', 'simultaneous'])
+    parser.add_argument('--turn-limit', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = BatchSimulator(args.games, game_mode=args.mode, turn_limit=args.turn_limit, seed=args.seed)
+    simulator.run()
+    print(simulator.win_counts())
+    print(f"{simulator.games_per_second:,.0f} games/s ({simulator.elapsed:.2f}s for {args.games} games)")
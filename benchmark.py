@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from game_environment import KabaddiGame, OPPONENT
+from agents import RandomAgent, GreedyAgent, AlphaBetaAgent, HybridAlphaBetaAgent, MCTSAgent, MatrixGameAgent
+
+SEED = 1234
+STANDARD_PLIES = (0, 10, 30)
+SEARCH_DEPTHS = (1, 2, 3, 4)
+MCTS_TIME_LIMIT = 0.5
+GAME_AGENTS = [
+    ('Greedy', 'turn_by_turn', lambda team: GreedyAgent(team)),
+    ('AlphaBeta (d=2)', 'turn_by_turn', lambda team: AlphaBetaAgent(team, depth=2)),
+    ('AlphaBeta (d=3)', 'turn_by_turn', lambda team: AlphaBetaAgent(team, depth=3)),
+    ('MCTS (t=0.05s)', 'turn_by_turn', lambda team: MCTSAgent(team, time_limit=0.05)),
+    ('Hybrid (d=2)', 'simultaneous', lambda team: HybridAlphaBetaAgent(team, depth=2)),
+    ('MatrixGame (d=2)', 'simultaneous', lambda team: MatrixGameAgent(team, depth=2)),
+]
+GROUPS = ('engine', 'alphabeta', 'mcts', 'games')
+
+def standard_positions():
+    # The opening and the positions after 10 and 30 plies of seeded random play.
+    positions = []
+    for plies in STANDARD_PLIES:
+        random.seed(SEED + plies)
+        game = KabaddiGame(turn_limit=100)
+        agents = {'A': RandomAgent('A'), 'B': RandomAgent('B')}
+        for _ in range(plies):
+            if game.check_terminal_state() is not None: break
+            game.apply_moves(agents[game.state.current_player_team].select_moves(game))
+            game.state.current_player_team = OPPONENT[game.state.current_player_team]
+        positions.append((f'ply{plies}', game))
+    return positions
+
+def calls_per_second(fn, calls_per_run, number, repeat=5):
+    return calls_per_run * number / min(timeit.repeat(fn, number=number, repeat=repeat))
+
+def metric(value, unit, higher_is_better=True):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+def bench_engine(positions):
+    games = [game for _, game in positions]
+    player_ids = [p.id for p in games[0].state.player_list]
+    moves = [list(game.joint_moves(game.state.current_player_team, prune=False)) for game in games]
+    greedy = GreedyAgent('A')
+
+    def apply_and_undo():
+        for game, options in zip(games, moves):
+            for move in options:
+                game.undo_moves(game.apply_moves(move))
+
+    return {
+        'engine.clone': metric(calls_per_second(lambda: [g.clone() for g in games], len(games), 2000), 'calls/s'),
+        'engine.apply_undo': metric(calls_per_second(apply_and_undo, sum(len(m) for m in moves), 200), 'calls/s'),
+        'engine.get_valid_moves': metric(calls_per_second(
+            lambda: [g.get_valid_moves(pid) for g in games for pid in player_ids], len(games) * len(player_ids), 2000), 'calls/s'),
+        'engine.check_terminal_state': metric(calls_per_second(lambda: [g.check_terminal_state() for g in games], len(games), 5000), 'calls/s'),
+        'engine.evaluate_state': metric(calls_per_second(lambda: [greedy.evaluate_state(g) for g in games], len(games), 2000), 'calls/s'),
+    }
+
+def count_nodes(agent, game):
+    # Every node the search visits is one apply_moves call on the game.
+    count = 0
+    apply_moves = game.apply_moves
+    def counting_apply(moves):
+        nonlocal count
+        count += 1
+        return apply_moves(moves)
+    game.apply_moves = counting_apply
+    try:
+        agent.select_moves(game)
+    finally:
+        del game.apply_moves
+    return count
+
+def bench_alphabeta(positions, repeat=3):
+    results = {}
+    for depth in SEARCH_DEPTHS:
+        nodes = 0
+        elapsed = 0.0
+        for _, game in positions:
+            random.seed(SEED)
+            nodes += count_nodes(AlphaBetaAgent(game.state.current_player_team, depth=depth), game)
+            best = float('inf')
+            for _ in range(repeat):
+                random.seed(SEED)
+                agent = AlphaBetaAgent(game.state.current_player_team, depth=depth)
+                start_time = time.perf_counter()
+                agent.select_moves(game)
+                best = min(best, time.perf_counter() - start_time)
+            elapsed += best
+        results[f'alphabeta.d{depth}.nodes'] = metric(nodes, 'nodes', higher_is_better=False)
+        results[f'alphabeta.d{depth}.nodes_per_second'] = metric(nodes / elapsed, 'nodes/s')
+    return results
+
+def bench_mcts(positions):
+    rollouts = 0
+    for _, game in positions:
+        random.seed(SEED)
+        agent = MCTSAgent(game.state.current_player_team, time_limit=MCTS_TIME_LIMIT, reuse_tree=False)
+        agent.select_moves(game)
+        rollouts += agent.last_rollouts
+    return {'mcts.rollouts_per_second': metric(rollouts / (MCTS_TIME_LIMIT * len(positions)), 'rollouts/s')}
+
+def bench_games(turn_limit=100, games=3):
+    # Seeded games against Random, timing every move of the benchmarked agent.
+    results = {}
+    for name, game_mode, make_agent in GAME_AGENTS:
+        latencies = []
+        elapsed = 0.0
+        for game_index in range(games):
+            random.seed(SEED + game_index)
+            game = KabaddiGame(game_mode=game_mode, turn_limit=turn_limit)
+            agent = make_agent('A')
+            select_moves = agent.select_moves
+            def timed_select(game):
+                start_time = time.perf_counter()
+                moves = select_moves(game)
+                latencies.append(time.perf_counter() - start_time)
+                return moves
+            agent.select_moves = timed_select
+            start_time = time.perf_counter()
+            game.run_game_loop(agent, RandomAgent('B'))
+            elapsed += time.perf_counter() - start_time
+        key = f'games.{name}'
+        results[f'{key}.mean_move_ms'] = metric(1000 * sum(latencies) / len(latencies), 'ms', higher_is_better=False)
+        results[f'{key}.max_move_ms'] = metric(1000 * max(latencies), 'ms', higher_is_better=False)
+        results[f'{key}.game_seconds'] = metric(elapsed / games, 's', higher_is_better=False)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(groups=GROUPS):
+    positions = standard_positions()
+    results = {}
+    if 'engine' in groups: results.update(bench_engine(positions))
+    if 'alphabeta' in groups: results.update(bench_alphabeta(positions))
+    if 'mcts' in groups: results.update(bench_mcts(positions))
+    if 'games' in groups: results.update(bench_games())
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': SEED,
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, threshold):
+    # A metric regresses when it is more than threshold (a fraction) worse than the baseline.
+    regressions = []
+    rows = []
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or not old['value']: continue
+        change = new['value'] / old['value'] - 1
+        worse = -change if new['higher_is_better'] else change
+        regressed = worse > threshold
+        if regressed: regressions.append(name)
+        rows.append((name, old['value'], new['value'], change, regressed))
+    return rows, regressions
+
+def format_value(value):
+    return f'{value:,.0f}' if abs(value) >= 100 else f'{value:.3g}'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Kabaddi engine and agents.")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the JSON results")
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=GROUPS)
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.20, help="fractional slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.only)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for name, result in report['results'].items():
+        print(f"{name:45} {format_value(result['value']):>14} {result['unit']}")
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        print(f"\nAgainst {args.compare} (commit {baseline['meta'].get('commit')}):")
+        for name, old, new, change, regressed in rows:
+            print(f"{name:45} {format_value(old):>14} -> {format_value(new):>14} {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
@@ -1,34 +1,238 @@
 import random
 import copy
+import heapq
+import itertools
+import math
+import time
+from functools import lru_cache
+
+OPPONENT = {'A': 'B', 'B': 'A'}
+# Move-log codes: a player's step is its index here, NO_MOVE when it was not given a move.
+MOVE_OFFSETS = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+MOVE_CODES = {offset: code for code, offset in enumerate(MOVE_OFFSETS)}
+NO_MOVE = 255
+
+class ZobristKeys:
+    def __init__(self, grid_size, num_players, seed=0x4B414244):
+        rng = random.Random(seed)
+        cells = [(x, y) for x in range(grid_size[0]) for y in range(grid_size[1])]
+        self.positions = [{cell: rng.getrandbits(64) for cell in cells} for _ in range(num_players)]
+        self.gold = [rng.getrandbits(64) for _ in range(num_players)]
+        self.captured = [rng.getrandbits(64) for _ in range(num_players)]
+        self.gold_taken = {'A': rng.getrandbits(64), 'B': rng.getrandbits(64)}
+        self.side = rng.getrandbits(64)
+
+@lru_cache(maxsize=None)
+def zobrist_keys(grid_size, num_players):
+    return ZobristKeys(grid_size, num_players)
+
+class _DistanceRows(dict):
+    # Manhattan distances from one cell to every cell, filled the first time the cell is asked for.
+    def __init__(self, cells):
+        super().__init__()
+        self.cells = cells
+
+    def __missing__(self, cell):
+        x, y = cell
+        row = self[cell] = {other: abs(other[0] - x) + abs(other[1] - y) for other in self.cells}
+        return row
+
+class GridTables:
+    def __init__(self, grid_size):
+        cells = [(x, y) for x in range(grid_size[0]) for y in range(grid_size[1])]
+        # Same order as the moves have always been listed: stay, down, up, right, left.
+        self.neighbours = {
+            (x, y): tuple(
+                (nx, ny) for nx, ny in ((x, y), (x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                if 0 <= nx < grid_size[0] and 0 <= ny < grid_size[1]
+            )
+            for x, y in cells
+        }
+        self.distance = _DistanceRows(cells)
+        half_way_x = grid_size[0] // 2
+        self.enemy_territory = {
+            'A': [x >= half_way_x for x in range(grid_size[0])],
+            'B': [x < half_way_x for x in range(grid_size[0])],
+        }
+        # Columns from each team's own side of the half-way line.
+        self.home_distance = {
+            'A': [abs(x - (half_way_x - 1)) for x in range(grid_size[0])],
+            'B': [abs(x - half_way_x) for x in range(grid_size[0])],
+        }
+
+@lru_cache(maxsize=None)
+def grid_tables(grid_size):
+    return GridTables(grid_size)
+
+def _iter_joint_moves(player_ids, options, twins):
+    # Drop joint moves that stack teammates on one square, and mirror images
+    # of moves for teammates that are interchangeable (same square, same gold).
+    yielded = False
+    for combination in itertools.product(*options):
+        if len(set(combination)) < len(combination): continue
+        if any(combination[i] > combination[j] for i, j in twins): continue
+        yielded = True
+        yield tuple(zip(player_ids, combination))
+    if not yielded:
+        for combination in itertools.product(*options):
+            yield tuple(zip(player_ids, combination))
+
+def _iter_ranked_joint_moves(player_ids, options, limit, twins):
+    # Each player's options are ranked best first; walk the product in order of
+    # rank sum, so the first few joint moves mix near-best choices for everyone.
+    first = (0,) * len(options)
+    heap = [(0, first)]
+    seen = {first}
+    yielded = 0
+    while heap and yielded < limit:
+        total, ranks = heapq.heappop(heap)
+        for i, rank in enumerate(ranks):
+            if rank + 1 < len(options[i]):
+                following = ranks[:i] + (rank + 1,) + ranks[i + 1:]
+                if following not in seen:
+                    seen.add(following)
+                    heapq.heappush(heap, (total + 1, following))
+        combination = tuple(moves[rank] for moves, rank in zip(options, ranks))
+        if twins is not None:
+            if len(set(combination)) < len(combination): continue
+            if any(combination[i] > combination[j] for i, j in twins): continue
+        yield tuple(zip(player_ids, combination))
+        yielded += 1
+    if not yielded:
+        yield tuple(zip(player_ids, (moves[0] for moves in options)))
+
+def default_start_layout(grid_size, team_size):
+    # Spread each team down its second column; 10x10 with two a side gives rows 2 and 7.
+    rows = [(2 * i + 1) * grid_size[1] // (2 * team_size) for i in range(team_size)]
+    return {
+        'A': [(1, y) for y in rows],
+        'B': [(grid_size[0] - 2, y) for y in rows],
+    }
+
+def _iter_sampled_joint_moves(player_ids, options, total, limit, twins):
+    # Decode distinct random indices of the full product instead of building it.
+    yielded = 0
+    for index in random.sample(range(total), min(total, 4 * limit)):
+        combination = []
+        for moves in options:
+            index, choice = divmod(index, len(moves))
+            combination.append(moves[choice])
+        if twins is not None:
+            if len(set(combination)) < len(combination): continue
+            if any(combination[i] > combination[j] for i, j in twins): continue
+        yield tuple(zip(player_ids, combination))
+        yielded += 1
+        if yielded == limit: return
 
 class Player:
-    def __init__(self, player_id, team, start_pos):
+    __slots__ = ('id', 'team', 'pos', 'has_gold', 'is_captured', 'index')
+
+    def __init__(self, player_id, team, start_pos, index=0):
         self.id = player_id
         self.team = team
         self.pos = start_pos
         self.has_gold = False
         self.is_captured = False
+        self.index = index
+
+    def copy(self):
+        player = Player(self.id, self.team, self.pos, self.index)
+        player.has_gold = self.has_gold
+        player.is_captured = self.is_captured
+        return player
 
     def __repr__(self):
         return f"Player({self.id}, Team: {self.team}, Pos: {self.pos}, Gold: {self.has_gold}, Captured: {self.is_captured})"
 
 class GameState:
-    def __init__(self, grid_size=(10, 10)):
+    __slots__ = ('grid_size', 'half_way_x', 'players', 'player_list', 'teams', 'gold_pos', 'turn', 'current_player_team', 'zobrist_keys', 'zobrist', 'grid_tables')
+
+    def __init__(self, grid_size=(10, 10), team_size=2, start_layout=None):
+        if grid_size[0] < 4 or grid_size[1] < 1:
+            raise ValueError("Grid must be at least 4 columns deep and 1 wide")
+        if team_size < 1:
+            raise ValueError("Teams need at least one player")
         self.grid_size = grid_size
         self.half_way_x = grid_size[0] // 2
         
-        self.players = {
-            'A1': Player('A1', 'A', (1, 2)),
-            'A2': Player('A2', 'A', (1, 7)),
-            'B1': Player('B1', 'B', (grid_size[0] - 2, 2)),
-            'B2': Player('B2', 'B', (grid_size[0] - 2, 7)),
-        }
+        layout = start_layout or default_start_layout(grid_size, team_size)
+        player_list = []
+        for team in ('A', 'B'):
+            if len(layout[team]) != team_size:
+                raise ValueError(f"Start layout for team {team} must have {team_size} positions")
+            for number, (x, y) in enumerate(layout[team], start=1):
+                if not (0 <= x < grid_size[0] and 0 <= y < grid_size[1]):
+                    raise ValueError(f"Start position {(x, y)} is off the grid")
+                player_list.append(Player(f'{team}{number}', team, (x, y)))
+        self._set_players(player_list)
         self.gold_pos = {
-            'A': (0, 5),
-            'B': (grid_size[0] - 1, 5)
+            'A': (0, grid_size[1] // 2),
+            'B': (grid_size[0] - 1, grid_size[1] // 2)
         }
         self.turn = 0
         self.current_player_team = 'A' 
+        self.zobrist_keys = zobrist_keys(grid_size, len(self.player_list))
+        self.zobrist = self.compute_zobrist()
+        self.grid_tables = grid_tables(grid_size)
+
+    def _set_players(self, player_list):
+        for index, player in enumerate(player_list):
+            player.index = index
+        self.player_list = player_list
+        self.players = {p.id: p for p in player_list}
+        self.teams = {'A': [p for p in player_list if p.team == 'A'], 'B': [p for p in player_list if p.team == 'B']}
+
+    def copy(self):
+        state = GameState.__new__(GameState)
+        state.grid_size = self.grid_size
+        state.half_way_x = self.half_way_x
+        state._set_players([p.copy() for p in self.player_list])
+        state.gold_pos = dict(self.gold_pos)
+        state.turn = self.turn
+        state.current_player_team = self.current_player_team
+        state.zobrist_keys = self.zobrist_keys
+        state.zobrist = self.zobrist
+        state.grid_tables = self.grid_tables
+        return state
+
+    def __getstate__(self):
+        # Zobrist keys and grid tables are shared per board and rebuilt identically from it, so
+        # worker processes fetch their own copies instead of receiving them with every game.
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('zobrist_keys', 'grid_tables')}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.zobrist_keys = zobrist_keys(self.grid_size, len(self.player_list))
+        self.grid_tables = grid_tables(self.grid_size)
+
+    def compute_zobrist(self):
+        keys = self.zobrist_keys
+        h = 0
+        for p in self.player_list:
+            h ^= keys.positions[p.index][p.pos]
+            if p.has_gold:
+                h ^= keys.gold[p.index]
+            if p.is_captured:
+                h ^= keys.captured[p.index]
+        for team, gold_pos in self.gold_pos.items():
+            if gold_pos is None:
+                h ^= keys.gold_taken[team]
+        return h
+
+    def key(self):
+        return (
+            tuple((p.pos, p.has_gold, p.is_captured) for p in self.player_list),
+            self.gold_pos['A'], self.gold_pos['B'], self.turn, self.current_player_team
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
 
     def is_in_enemy_territory(self, player):
         if player.team == 'A':
@@ -40,105 +244,204 @@ class GameState:
         return not self.is_in_enemy_territory(player)
 
 class KabaddiGame:
-    def __init__(self, game_mode='turn_by_turn', turn_limit=100):
-        self.state = GameState()
+    def __init__(self, game_mode='turn_by_turn', turn_limit=100, grid_size=(10, 10), team_size=2, start_layout=None):
+        self.state = GameState(grid_size, team_size, start_layout)
         self.game_mode = game_mode
         self.turn_limit = turn_limit
+        self.agent_stats = {}
+        self.think_time = {'A': 0.0, 'B': 0.0}
+        self.move_log = None
+        # Told about every apply_moves/undo_moves, e.g. an agent's IncrementalEvaluator during a search.
+        self.observer = None
 
     def clone(self):
-        return copy.deepcopy(self)
+        new_game = copy.copy(self)
+        new_game.state = self.state.copy()
+        new_game.observer = None
+        return new_game
 
     def get_valid_moves(self, player_id):
         player = self.state.players.get(player_id)
         if not player or player.is_captured:
             return []
 
-        x, y = player.pos
-        potential_moves = [
-            (x, y),      # Stay
-            (x + 1, y),  # Down
-            (x - 1, y),  # Up
-            (x, y + 1),  # Right
-            (x, y - 1),  # Left
-        ]
+        return list(self.state.grid_tables.neighbours[player.pos])
 
-        valid_moves = []
-        for move_x, move_y in potential_moves:
-            if 0 <= move_x < self.state.grid_size[0] and 0 <= move_y < self.state.grid_size[1]:
-                valid_moves.append((move_x, move_y))
-        
-        return valid_moves
+    def joint_moves(self, team, prune=True, candidates=None):
+        players = [p for p in self.state.teams[team] if not p.is_captured]
+        if not players: return iter(())
+        player_ids = tuple(p.id for p in players)
+        if candidates is None:
+            options = [self.get_valid_moves(p.id) for p in players]
+        else:
+            options = [candidates[p.id] for p in players]
+        if not prune or len(players) == 1:
+            return (tuple(zip(player_ids, combination)) for combination in itertools.product(*options))
+        return _iter_joint_moves(player_ids, options, self._interchangeable_pairs(players))
+
+    def sample_joint_moves(self, team, limit, prune=True):
+        players = [p for p in self.state.teams[team] if not p.is_captured]
+        options = [self.get_valid_moves(p.id) for p in players]
+        total = math.prod(len(o) for o in options)
+        if total <= limit: return self.joint_moves(team, prune)
+        player_ids = tuple(p.id for p in players)
+        twins = self._interchangeable_pairs(players) if prune else None
+        return _iter_sampled_joint_moves(player_ids, options, total, limit, twins)
+
+    def ranked_joint_moves(self, team, ranked, limit, prune=True):
+        # ranked maps each active player to its moves, best first; yields at most limit joint moves.
+        players = [p for p in self.state.teams[team] if not p.is_captured]
+        if not players: return iter(())
+        player_ids = tuple(p.id for p in players)
+        twins = self._interchangeable_pairs(players) if prune and len(players) > 1 else None
+        return _iter_ranked_joint_moves(player_ids, [ranked[p.id] for p in players], limit, twins)
+
+    def _interchangeable_pairs(self, players):
+        return [
+            (i, j) for i, j in itertools.combinations(range(len(players)), 2)
+            if players[i].pos == players[j].pos and players[i].has_gold == players[j].has_gold
+        ]
 
     def apply_moves(self, moves):
-        for player_id, new_pos in moves.items():
-            if player_id in self.state.players and not self.state.players[player_id].is_captured:
-                self.state.players[player_id].pos = new_pos
+        state = self.state
+        players = state.players
+        keys = state.zobrist_keys
+        zobrist = state.zobrist
+        h = zobrist
+        moved = []
+        landed = {}
+        for player_id, new_pos in (moves.items() if isinstance(moves, dict) else moves):
+            player = players.get(player_id)
+            if player is not None and not player.is_captured:
+                moved.append((player, player.pos))
+                if new_pos != player.pos:
+                    position_keys = keys.positions[player.index]
+                    h ^= position_keys[player.pos] ^ position_keys[new_pos]
+                player.pos = new_pos
+                landed[new_pos] = player.team
 
-        for player in self.state.players.values():
+        pickups = []
+        gold_pos = state.gold_pos
+        for player in state.player_list:
             if player.is_captured or player.has_gold:
                 continue
             
-            opponent_team = 'B' if player.team == 'A' else 'A'
-            opponent_gold_pos = self.state.gold_pos.get(opponent_team)
+            opponent_team = OPPONENT[player.team]
+            opponent_gold_pos = gold_pos[opponent_team]
             
             if opponent_gold_pos and player.pos == opponent_gold_pos:
                 player.has_gold = True
-                self.state.gold_pos[opponent_team] = None
-
-        player_positions = {}
-        for p_id, p in self.state.players.items():
-            if not p.is_captured:
-                if p.pos not in player_positions:
-                    player_positions[p.pos] = []
-                player_positions[p.pos].append(p)
-        
-        for pos, players_on_square in player_positions.items():
-            if len(players_on_square) > 1:
-                teams_on_square = {p.team for p in players_on_square}
-                if len(teams_on_square) > 1:
-                    for p in players_on_square:
-                        if self.state.is_in_enemy_territory(p):
-                            p.is_captured = True
+                gold_pos[opponent_team] = None
+                h ^= keys.gold[player.index] ^ keys.gold_taken[opponent_team]
+                pickups.append((player, opponent_team, opponent_gold_pos))
+
+        # Only squares someone just moved onto can hold both teams.
+        captures = []
+        contested = [p.pos for p in state.player_list if not p.is_captured and landed.get(p.pos, p.team) != p.team]
+        if contested:
+            for p in state.player_list:
+                if not p.is_captured and p.pos in contested and state.is_in_enemy_territory(p):
+                    p.is_captured = True
+                    h ^= keys.captured[p.index]
+                    captures.append(p)
         
-        self.state.turn += 1
+        state.zobrist = h
+        turn = state.turn
+        state.turn += 1
+        undo = moved, pickups, captures, turn, zobrist
+        if self.observer is not None: self.observer.applied(undo)
+        return undo
+
+    def undo_moves(self, undo):
+        moved, pickups, captures, turn, zobrist = undo
+        state = self.state
+        for player in captures:
+            player.is_captured = False
+        for player, opponent_team, gold_pos in pickups:
+            player.has_gold = False
+            state.gold_pos[opponent_team] = gold_pos
+        for player, old_pos in reversed(moved):
+            player.pos = old_pos
+        state.turn = turn
+        state.zobrist = zobrist
+        if self.observer is not None: self.observer.undone(undo)
 
     def check_terminal_state(self):
-        for player in self.state.players.values():
-            if player.has_gold and self.state.is_in_home_territory(player):
+        state = self.state
+        enemy_territory = state.grid_tables.enemy_territory
+        for player in state.player_list:
+            if player.has_gold and not enemy_territory[player.team][player.pos[0]]:
                 return player.team
 
-        active_players_A = [p for p in self.state.players.values() if p.team == 'A' and not p.is_captured]
-        active_players_B = [p for p in self.state.players.values() if p.team == 'B' and not p.is_captured]
-
-        if not active_players_A:
+        if all(p.is_captured for p in state.teams['A']):
             return 'B'
-        if not active_players_B:
+        if all(p.is_captured for p in state.teams['B']):
             return 'A'
 
-        if self.state.turn >= self.turn_limit:
+        if state.turn >= self.turn_limit:
             return 'draw'
 
         return None
 
-    def run_game_loop(self, agent_A, agent_B):
+    def encode_moves(self, moves):
+        # One byte per player, in player_list order.
+        state = self.state
+        codes = bytearray([NO_MOVE]) * len(state.player_list)
+        for player_id, (x, y) in (moves.items() if isinstance(moves, dict) else moves):
+            player = state.players.get(player_id)
+            if player is None or player.is_captured: continue
+            step = (x - player.pos[0], y - player.pos[1])
+            if step not in MOVE_CODES:
+                raise ValueError(f"{player_id} cannot move from {player.pos} to {(x, y)}")
+            codes[player.index] = MOVE_CODES[step]
+        return bytes(codes)
+
+    def decode_moves(self, codes):
+        moves = {}
+        for player, code in zip(self.state.player_list, codes):
+            if code == NO_MOVE: continue
+            dx, dy = MOVE_OFFSETS[code]
+            moves[player.id] = (player.pos[0] + dx, player.pos[1] + dy)
+        return moves
+
+    def _select_moves(self, agent):
+        start_time = time.perf_counter()
+        moves = agent.select_moves(self)
+        elapsed = time.perf_counter() - start_time
+        self.think_time[agent.team] += elapsed
+        stats = getattr(agent, 'stats', None)
+        if stats is not None: stats.record_move(elapsed)
+        return moves
+
+    def run_game_loop(self, agent_A, agent_B, record_moves=False):
+        # With record_moves, move_log collects encode_moves() of every ply.
         winner = None
+        self.think_time = {'A': 0.0, 'B': 0.0}
+        self.move_log = log = bytearray() if record_moves else None
         while winner is None:
             if self.game_mode == 'turn_by_turn':
                 current_agent = agent_A if self.state.current_player_team == 'A' else agent_B
-                moves = current_agent.select_moves(self)
+                moves = self._select_moves(current_agent)
                 if not moves: 
                     break
+                if log is not None: log += self.encode_moves(moves)
                 self.apply_moves(moves)
-                self.state.current_player_team = 'B' if self.state.current_player_team == 'A' else 'A'
+                self.state.current_player_team = OPPONENT[self.state.current_player_team]
             else: 
-                moves_A = agent_A.select_moves(self)
-                moves_B = agent_B.select_moves(self)
+                moves_A = self._select_moves(agent_A)
+                moves_B = self._select_moves(agent_B)
                 if not moves_A and not moves_B:
                     break
                 all_moves = {**moves_A, **moves_B}
+                if log is not None: log += self.encode_moves(all_moves)
                 self.apply_moves(all_moves)
             
             winner = self.check_terminal_state()
         
+        # Per-agent summaries for agents that were asked to collect stats.
+        self.agent_stats = {
+            team: agent.stats.as_dict()
+            for team, agent in (('A', agent_A), ('B', agent_B)) if getattr(agent, 'stats', None) is not None
+        }
         return winner if winner else 'draw'
 
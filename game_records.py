@@ -0,0 +1,84 @@
+import json
+import os
+from game_environment import KabaddiGame, OPPONENT
+
+def layout_record(start_layout):
+    # JSON form of a start layout: {'A': [[x, y], ...], 'B': [...]}, or None for the default.
+    if start_layout is None: return None
+    return {team: [list(pos) for pos in start_layout[team]] for team in ('A', 'B')}
+
+def agent_fingerprint(agent_class, params):
+    # Class and parameters, so a rerun after changing e.g. a time limit does not reuse old games.
+    arguments = ', '.join(f'{name}={value!r}' for name, value in sorted(params.items()))
+    return f"{agent_class.__module__}.{agent_class.__qualname__}({arguments})"
+
+def record_key(record):
+    # A game is identified by its setup, matchup and seed; a rerun skips keys already in the stream.
+    layout = record.get('start_layout')
+    return (
+        record['mode'], record['agent_A'], record['agent_B'], record.get('config_A'), record.get('config_B'), record['turn_limit'],
+        tuple(record['grid_size']), record['team_size'], record['game_index'], record['seed'],
+        layout and tuple(tuple(map(tuple, layout[team])) for team in ('A', 'B')),
+    )
+
+def _trim_partial_line(path):
+    # A run killed mid-write can leave half a line at the end; cut it so appends start clean.
+    if not os.path.exists(path): return
+    with open(path, 'rb+') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+class ResultsStream:
+    # One JSON line per finished game. With move_log, the game's encoded plies go to
+    # path + '.moves' and the line stores their [offset, length] under 'moves'.
+    def __init__(self, path, move_log=False):
+        self.path = path
+        self.moves_path = path + '.moves'
+        self.move_log = move_log
+        self._trimmed = False
+
+    def __iter__(self):
+        if not os.path.exists(self.path): return
+        with open(self.path) as f:
+            for line in f:
+                if line.endswith('\n'): yield json.loads(line)
+
+    def append(self, record, moves=None):
+        if not self._trimmed:
+            _trim_partial_line(self.path)
+            self._trimmed = True
+        if self.move_log and moves is not None:
+            with open(self.moves_path, 'ab') as f:
+                record = dict(record, moves=[f.seek(0, os.SEEK_END), len(moves)])
+                f.write(moves)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        return record
+
+    def read_moves(self, record):
+        offset, length = record['moves']
+        with open(self.moves_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def replay(self, record):
+        return replay(record, self.read_moves(record))
+
+def replay(record, moves):
+    # Yields the game at the start and after every recorded ply (the same object, updated in place).
+    game = KabaddiGame(record['mode'], record['turn_limit'], tuple(record['grid_size']), record['team_size'], record.get('start_layout'))
+    width = len(game.state.player_list)
+    yield game
+    for start in range(0, len(moves), width):
+        game.apply_moves(game.decode_moves(moves[start:start + width]))
+        if game.game_mode == 'turn_by_turn':
+            game.state.current_player_team = OPPONENT[game.state.current_player_team]
+        yield game
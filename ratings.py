@@ -0,0 +1,64 @@
+import math
+import numpy as np
+
+ELO_SCALE = 400 / math.log(10)
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+class SequentialTest:
+    # Two one-sided GSPRTs on the first agent's score per game (win 1, draw 1/2, loss 0): "stronger by
+    # elo" against "even", and "weaker by elo" against "even". A matchup is settled as soon as either
+    # accepts its alternative, or both accept that the agents are even.
+    def __init__(self, elo=150, alpha=0.01, beta=0.05, min_games=4):
+        self.elo = elo
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.min_games = min_games
+
+    def llr(self, wins, draws, losses, elo):
+        # Normal approximation to the log-likelihood ratio. Half a pseudo win and half a pseudo loss
+        # keep the variance above zero when every game so far ended the same way.
+        n = wins + draws + losses + 1
+        mean = (wins + 0.5 * draws + 0.5) / n
+        variance = (wins + 0.5 + 0.25 * draws) / n - mean * mean
+        s0, s1 = 0.5, expected_score(elo)
+        return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+    def decide(self, wins, draws, losses):
+        # 'A' or 'B' for the stronger agent, 'even', or None while the result is still open.
+        if wins + draws + losses < self.min_games: return None
+        stronger = self.llr(wins, draws, losses, self.elo)
+        weaker = self.llr(wins, draws, losses, -self.elo)
+        if stronger >= self.upper: return 'A'
+        if weaker >= self.upper: return 'B'
+        if stronger <= self.lower and weaker <= self.lower: return 'even'
+        return None
+
+def bradley_terry(scores, names, prior_draws=1.0, iterations=50):
+    # scores: {(name_i, name_j): (points for i, games)} with draws as half points. Returns
+    # {name: (elo, standard error)} with the mean rating at 0. Each pair that played also gets
+    # prior_draws virtual draws, so an agent that won or lost every game still has a finite rating.
+    index = {name: i for i, name in enumerate(names)}
+    pairs = [(index[a], index[b], points + prior_draws / 2, games + prior_draws) for (a, b), (points, games) in scores.items() if games]
+    ratings = np.zeros(len(names))
+    hessian = np.zeros((len(names), len(names)))
+    for _ in range(iterations):
+        gradient = np.zeros(len(names))
+        hessian[:] = 0
+        for i, j, points, games in pairs:
+            p = 1 / (1 + math.exp(ratings[j] - ratings[i]))
+            gradient[i] += points - games * p
+            gradient[j] -= points - games * p
+            w = games * p * (1 - p)
+            hessian[i, i] += w
+            hessian[j, j] += w
+            hessian[i, j] -= w
+            hessian[j, i] -= w
+        # Ratings are only defined up to a constant; the pseudo-inverse takes the zero-mean step.
+        step = np.linalg.pinv(hessian) @ gradient
+        ratings += step
+        if np.abs(step).max() < 1e-9: break
+    ratings -= ratings.mean()
+    errors = np.sqrt(np.maximum(np.diag(np.linalg.pinv(hessian)), 0))
+    return {name: (ELO_SCALE * ratings[i], ELO_SCALE * errors[i]) for name, i in index.items()}
@@ -0,0 +1,296 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from functools import lru_cache
+import numpy as np
+from game_environment import KabaddiGame, OPPONENT
+from batch_simulator import DIRECTIONS, TEAMS
+
+# Exact turn_by_turn values for positions with at most two active players on one
+# side and one on the other. Captured players never act again, so a position is
+# just the active players' squares (in player order), where each gold is (at home,
+# gone with a captured carrier, or carried by one of the active opponents) and the
+# side to move. Each entry is one signed byte for the side to move:
+#   0     draw: neither side can force a result however long the game runs
+#   +d/-d win/loss in d plies with best play (d = 127 means 127 or more)
+#   -128  a carrier is already home, so the game is over
+MATERIAL = ((1, 1), (2, 1), (1, 2))
+SATURATED = 127
+TERMINAL = -128
+
+def table_shape(cells, material):
+    num_A, num_B = material
+    # Gold of A is at home, gone or carried by a B player, and the other way round.
+    return (cells,) * (num_A + num_B) + (2 + num_B, 2 + num_A, 2)
+
+class Tablebase:
+    def __init__(self, path, mode='r'):
+        with open(path + '.json') as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.grid_size = tuple(self.meta['grid_size'])
+        width, height = self.grid_size
+        self.cells = width * height
+        self.shapes = {material: table_shape(self.cells, material) for material in MATERIAL}
+        data = np.memmap(path, dtype=np.int8, mode=mode, shape=(sum(math.prod(s) for s in self.shapes.values()),))
+        self.tables = {}
+        offset = 0
+        for material in MATERIAL:
+            size = math.prod(self.shapes[material])
+            self.tables[material] = data[offset:offset + size]
+            offset += size
+        self.data = data
+
+        cell_x = np.arange(self.cells) // height
+        cell_y = np.arange(self.cells) % height
+        neighbours = np.full((self.cells, len(DIRECTIONS)), -1, dtype=np.int32)
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            x, y = cell_x + dx, cell_y + dy
+            on_grid = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            neighbours[on_grid, d] = (x * height + y)[on_grid]
+        self.neighbours = neighbours
+        half_way_x = width // 2
+        self.enemy_territory = (cell_x >= half_way_x, cell_x < half_way_x)
+        self.gold_cell = (height // 2, (width - 1) * height + height // 2)
+
+    @property
+    def complete(self):
+        return all(self.meta['tables'][name]['complete'] for name in self.meta['tables'])
+
+    @property
+    def nbytes(self):
+        return self.data.size * self.data.itemsize
+
+    def counts(self):
+        counts = {}
+        for material, table in self.tables.items():
+            values = np.bincount(table.view(np.uint8), minlength=256)
+            counts[material_name(material)] = {
+                'win': int(values[1:128].sum()), 'loss': int(values[129:256].sum()),
+                'draw': int(values[0]), 'terminal': int(values[128]),
+            }
+        return counts
+
+    def _index(self, state):
+        active = [[p for p in state.teams[team] if not p.is_captured] for team in TEAMS]
+        material = (len(active[0]), len(active[1]))
+        if material not in self.tables: return None, None
+        height = self.grid_size[1]
+        coords = [p.pos[0] * height + p.pos[1] for p in active[0] + active[1]]
+        for t, team in enumerate(TEAMS):
+            if state.gold_pos[team] is not None:
+                coords.append(0)
+            else:
+                carriers = [i for i, p in enumerate(active[1 - t]) if p.has_gold]
+                coords.append(2 + carriers[0] if carriers else 1)
+        coords.append(TEAMS.index(state.current_player_team))
+        return material, int(np.ravel_multi_index(coords, self.shapes[material]))
+
+    def probe(self, game: KabaddiGame):
+        if game.game_mode != 'turn_by_turn' or game.state.grid_size != self.grid_size: return None
+        material, index = self._index(game.state)
+        if material is None or not self.meta['tables'][material_name(material)]['complete']: return None
+        return int(self.tables[material][index])
+
+    def select_moves(self, game: KabaddiGame):
+        # Only answer when the result is decided within the turns left; otherwise let the agent search.
+        code = self.probe(game)
+        remaining = game.turn_limit - game.state.turn
+        if code is None or not decisive(code, remaining): return None
+        team = game.state.current_player_team
+        best_move, best_score = None, None
+        for move in game.joint_moves(team, prune=False):
+            undo = game.apply_moves(move)
+            game.state.current_player_team = OPPONENT[team]
+            winner = game.check_terminal_state()
+            if winner == team:
+                score = (2, 0)
+            elif winner == OPPONENT[team]:
+                # Losing on the spot is worse than any slower loss.
+                score = (-1, 0)
+            elif winner is not None:
+                score = (1, 0)
+            else:
+                reply = self.probe(game)
+                if decisive(reply, remaining - 1):
+                    score = (2, reply) if reply < 0 else (0, reply)
+                else:
+                    score = (1, 0)
+            game.undo_moves(undo)
+            game.state.current_player_team = team
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+        return dict(best_move)
+
+    def _step(self, pos, gold, mover, combo):
+        # One move of the side to move for a batch of positions, as in KabaddiGame.apply_moves.
+        other = 1 - mover
+        pos = [list(pos[0]), list(pos[1])]
+        gold = [gold[0].copy(), gold[1].copy()]
+        valid = np.ones(gold[0].shape, dtype=bool)
+        for i, d in enumerate(combo):
+            new = self.neighbours[pos[mover][i], d]
+            valid &= new >= 0
+            pos[mover][i] = new
+        for t in (0, 1):
+            for i, cell in enumerate(pos[t]):
+                pickup = (gold[1 - t] == 0) & (cell == self.gold_cell[1 - t])
+                gold[1 - t][pickup] = 2 + i
+        # Only the side that moved lands, so only the other side can be captured.
+        captured = []
+        for cell in pos[other]:
+            contested = np.zeros_like(valid)
+            for landed in pos[mover]:
+                contested |= landed == cell
+            captured.append(contested & self.enemy_territory[other][cell])
+
+        winner = np.full(valid.shape, -1, dtype=np.int8)
+        for t in (0, 1):
+            for i, cell in enumerate(pos[t]):
+                home = (gold[1 - t] == 2 + i) & ~self.enemy_territory[t][cell]
+                winner[home & (winner == -1)] = t
+        all_captured = np.logical_and.reduce(captured)
+        winner[all_captured & (winner == -1)] = mover
+
+        code = np.zeros(valid.shape, dtype=np.int8)
+        live = valid & (winner == -1)
+        for kept in itertools.product((True, False), repeat=len(pos[other])):
+            if not any(kept): continue
+            rows = live.copy()
+            for hit, keep in zip(captured, kept):
+                rows &= hit != keep
+            if not rows.any(): continue
+            remaining = [i for i, keep in enumerate(kept) if keep]
+            # Gold carried by a captured player is gone; other carriers are renumbered.
+            carried = gold[mover][rows]
+            remap = np.array([0, 1] + [2 + remaining.index(i) if i in remaining else 1 for i in range(len(kept))])
+            next_gold = [None, None]
+            next_gold[mover] = remap[carried]
+            next_gold[other] = gold[other][rows]
+            next_pos = [[cell[rows] for cell in pos[0]], [cell[rows] for cell in pos[1]]]
+            next_pos[other] = [next_pos[other][i] for i in remaining]
+            material = (len(next_pos[0]), len(next_pos[1]))
+            index = np.ravel_multi_index(
+                next_pos[0] + next_pos[1] + [next_gold[0], next_gold[1], np.full(carried.shape, other)],
+                self.shapes[material],
+            )
+            code[rows] = self.tables[material][index]
+        return valid, winner, code
+
+    def _mark_terminal(self, material, chunk_size):
+        table = self.tables[material]
+        num_A = material[0]
+        for start in range(0, table.size, chunk_size):
+            coords = np.unravel_index(np.arange(start, min(start + chunk_size, table.size)), self.shapes[material])
+            pos = [coords[:num_A], coords[num_A:-3]]
+            gold = coords[-3:-1]
+            home = np.zeros(coords[0].shape, dtype=bool)
+            for t in (0, 1):
+                for i, cell in enumerate(pos[t]):
+                    home |= (gold[1 - t] == 2 + i) & ~self.enemy_territory[t][cell]
+            table[start:start + home.size][home] = TERMINAL
+
+    def _sweep(self, material, n, chunk_size):
+        # Decide every open position that wins or loses in exactly n plies. Values
+        # written during this sweep are +-n and are not read back by it, so an
+        # interrupted sweep can simply be run again. Returns how many positions
+        # hold +-n afterwards, including any a killed run wrote before resuming.
+        table = self.tables[material]
+        num_A = material[0]
+        previous = min(n - 1, SATURATED)
+        found = 0
+        for start in range(0, table.size, chunk_size):
+            block = table[start:start + chunk_size]
+            todo = np.flatnonzero(block == 0)
+            if not todo.size: continue
+            coords = np.unravel_index(start + todo, self.shapes[material])
+            side = coords[-1]
+            wins = np.zeros(todo.size, dtype=bool)
+            losses = np.zeros(todo.size, dtype=bool)
+            for mover in (0, 1):
+                rows = np.flatnonzero(side == mover)
+                if not rows.size: continue
+                pos = [[c[rows] for c in coords[:num_A]], [c[rows] for c in coords[num_A:-3]]]
+                gold = [coords[-3][rows], coords[-2][rows]]
+                win = np.zeros(rows.size, dtype=bool)
+                loss = np.ones(rows.size, dtype=bool)
+                for combo in itertools.product(range(len(DIRECTIONS)), repeat=len(pos[mover])):
+                    valid, winner, code = self._step(pos, gold, mover, combo)
+                    undecided = winner == -1
+                    win |= valid & ((winner == mover) | (undecided & (code < 0) & (code >= -previous)))
+                    loss &= ~valid | (winner == 1 - mover) | (undecided & (code > 0) & (code <= previous))
+                wins[rows] = win
+                losses[rows] = loss & ~win
+            block[todo[wins]] = min(n, SATURATED)
+            block[todo[losses]] = -min(n, SATURATED)
+            found += int(wins.sum() + losses.sum())
+        if n < SATURATED:
+            # Once saturated, +-127 is read back and a sweep that finds nothing is a fixpoint.
+            found = 0
+            for start in range(0, table.size, chunk_size):
+                block = table[start:start + chunk_size]
+                found += int(np.count_nonzero((block == n) | (block == -n)))
+        return found
+
+    def _save_meta(self):
+        self.data.flush()
+        with open(self.path + '.json.tmp', 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(self.path + '.json.tmp', self.path + '.json')
+
+def material_name(material):
+    return f'{material[0]}v{material[1]}'
+
+def decisive(code, remaining):
+    return code is not None and 0 < abs(code) < SATURATED and abs(code) <= remaining
+
+def generate(path, grid_size=(10, 10), chunk_size=1 << 20, log=print):
+    # Resumable: progress is recorded next to the table after every sweep.
+    if not os.path.exists(path + '.json'):
+        shapes = [table_shape(grid_size[0] * grid_size[1], material) for material in MATERIAL]
+        np.memmap(path, dtype=np.int8, mode='w+', shape=(sum(math.prod(s) for s in shapes),)).flush()
+        meta = {
+            'grid_size': list(grid_size),
+            'tables': {material_name(m): {'iterations': -1, 'complete': False} for m in MATERIAL},
+        }
+        with open(path + '.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+    tablebase = Tablebase(path, mode='r+')
+    if tablebase.grid_size != tuple(grid_size):
+        raise ValueError(f"{path} holds a {tablebase.grid_size} tablebase, not {tuple(grid_size)}")
+    # 1v1 first: captures in the larger tables lead into it.
+    for material in MATERIAL:
+        progress = tablebase.meta['tables'][material_name(material)]
+        if progress['complete']: continue
+        if progress['iterations'] < 0:
+            tablebase._mark_terminal(material, chunk_size)
+            progress['iterations'] = 0
+            tablebase._save_meta()
+        while not progress['complete']:
+            n = progress['iterations'] + 1
+            start_time = time.time()
+            found = tablebase._sweep(material, n, chunk_size)
+            progress['iterations'] = n
+            progress['complete'] = found == 0
+            tablebase._save_meta()
+            log(f"{material_name(material)} ply {n}: {found} positions decided ({time.time() - start_time:.1f}s)")
+    return tablebase
+
+@lru_cache(maxsize=None)
+def load_tablebase(path):
+    return Tablebase(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build (or resume building) the turn_by_turn endgame tablebase.")
+    parser.add_argument('path', nargs='?', default='tablebase_10x10.bin')
+    parser.add_argument('--grid', type=int, nargs=2, default=(10, 10), metavar=('ROWS', 'COLS'))
+    parser.add_argument('--chunk-size', type=int, default=1 << 20)
+    args = parser.parse_args()
+
+    tablebase = generate(args.path, tuple(args.grid), args.chunk_size)
+    print(f"{args.path}: {tablebase.nbytes:,} bytes, {tablebase.data.size:,} positions")
+    for name, counts in tablebase.counts().items():
+        print(f"  {name}: {counts}")
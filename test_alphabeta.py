@@ -0,0 +1,42 @@
+import random
+import pytest
+from game_environment import KabaddiGame, OPPONENT
+from agents import AlphaBetaAgent, MatrixGameAgent, RandomAgent
+
+def position(game_mode, seed, plies=8):
+    random.seed(seed)
+    game = KabaddiGame(game_mode, turn_limit=30)
+    for _ in range(plies):
+        if game_mode == 'turn_by_turn':
+            game.apply_moves(RandomAgent(game.state.current_player_team).select_moves(game))
+            game.state.current_player_team = OPPONENT[game.state.current_player_team]
+        else:
+            game.apply_moves({**RandomAgent('A').select_moves(game), **RandomAgent('B').select_moves(game)})
+    return game
+
+def root_value(agent, game, depth):
+    _, value, _ = agent._search_root(game, list(agent._candidate_moves(game, agent.team)), depth)
+    return value
+
+@pytest.mark.parametrize('seed', range(8))
+def test_entries_searched_past_the_turn_limit_are_not_reused(seed):
+    # Zobrist keys leave out the turn, so the same position recurs closer to the limit.
+    game = position('turn_by_turn', seed)
+    team = game.state.current_player_team
+    warm = AlphaBetaAgent(team)
+    game.state.turn = 10
+    root_value(warm, game, 4)
+    game.state.turn = 28
+    assert root_value(warm, game, 2) == root_value(AlphaBetaAgent(team), game, 2)
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matrix_values_searched_past_the_turn_limit_are_not_reused(seed):
+    game = position('simultaneous', seed)
+    warm = MatrixGameAgent('A', matrix_branching=4)
+    game.state.turn = 10
+    warm._solve_node(game, 3)
+    game.state.turn = 28
+    _, strategy, value = warm._solve_node(game, 2)
+    _, fresh_strategy, fresh_value = MatrixGameAgent('A', matrix_branching=4)._solve_node(game, 2)
+    assert value == fresh_value
+    assert list(strategy) == list(fresh_strategy)
@@ -0,0 +1,52 @@
+import random
+import pytest
+from game_environment import KabaddiGame, OPPONENT
+from agents import RandomAgent
+from batch_simulator import BatchSimulator
+
+SETUPS = [((10, 10), 2), ((8, 6), 3), ((12, 12), 1), ((6, 4), 1)]
+
+def replay(simulator, game_index, game_mode):
+    # Plays a recorded batch game through KabaddiGame, checking every move is legal there too.
+    game = KabaddiGame(game_mode, simulator.turn_limit, simulator.grid_size, len(simulator.player_ids) // 2)
+    for moves in simulator.moves_for(game_index):
+        assert game.check_terminal_state() is None
+        for player_id, pos in moves.items():
+            assert pos in game.get_valid_moves(player_id)
+        if game_mode == 'turn_by_turn':
+            team = game.state.current_player_team
+            assert set(moves) == {p.id for p in game.state.teams[team] if not p.is_captured}
+        game.apply_moves(moves)
+        if game_mode == 'turn_by_turn':
+            game.state.current_player_team = OPPONENT[game.state.current_player_team]
+    return game
+
+@pytest.mark.parametrize('grid_size, team_size', SETUPS)
+@pytest.mark.parametrize('game_mode', ['turn_by_turn', 'simultaneous', 'mixed'])
+def test_recorded_games_replay_to_the_same_result(game_mode, grid_size, team_size):
+    modes = ['turn_by_turn', 'simultaneous'] * 40 if game_mode == 'mixed' else game_mode
+    simulator = BatchSimulator(80, modes, turn_limit=60, grid_size=grid_size, team_size=team_size, seed=1, record=True)
+    results = simulator.run()
+    for game_index, result in enumerate(results):
+        game = replay(simulator, game_index, modes if game_mode != 'mixed' else modes[game_index])
+        assert game.check_terminal_state() == result
+        assert game.state.turn == simulator.turn[game_index]
+    if grid_size == (6, 4):
+        # Random play on larger boards mostly draws; the small board covers wins by both sides.
+        assert set(results) == {'A', 'B', 'draw'}
+
+def test_moves_for_needs_record():
+    simulator = BatchSimulator(4, seed=0)
+    simulator.run()
+    with pytest.raises(ValueError):
+        simulator.moves_for(0)
+
+def test_outcomes_match_the_python_game_loop():
+    random.seed(0)
+    counts = {'A': 0, 'B': 0, 'draw': 0}
+    for _ in range(400):
+        counts[KabaddiGame(turn_limit=60).run_game_loop(RandomAgent('A'), RandomAgent('B'))] += 1
+    batch = BatchSimulator(4000, turn_limit=60, seed=0)
+    batch.run()
+    for name, count in batch.win_counts().items():
+        assert abs(count / 4000 - counts[name] / 400) < 0.08, (name, counts, batch.win_counts())
@@ -0,0 +1,68 @@
+import pickle
+import random
+import pytest
+from game_environment import KabaddiGame, OPPONENT
+from agents import RandomAgent
+
+def random_moves(game):
+    if game.game_mode == 'turn_by_turn':
+        return RandomAgent(game.state.current_player_team).select_moves(game)
+    return {**RandomAgent('A').select_moves(game), **RandomAgent('B').select_moves(game)}
+
+def snapshot(game):
+    return game.state.key(), game.state.zobrist, game.check_terminal_state()
+
+@pytest.mark.parametrize('game_mode', ['turn_by_turn', 'simultaneous'])
+@pytest.mark.parametrize('seed', range(20))
+def test_undo_path_matches_clone_path(game_mode, seed):
+    random.seed(seed)
+    grid_size, team_size = random.choice([((10, 10), 2), ((6, 4), 1), ((8, 6), 3)])
+    game = KabaddiGame(game_mode, turn_limit=60, grid_size=grid_size, team_size=team_size)
+    while game.check_terminal_state() is None:
+        moves = random_moves(game)
+        before = snapshot(game)
+        # The clone path: play the move on a copy.
+        cloned = game.clone()
+        cloned.apply_moves(moves)
+        # The undo path: play it, check it matches, take it back and check nothing leaked.
+        undo = game.apply_moves(moves)
+        assert snapshot(game) == snapshot(cloned)
+        assert game.state.zobrist == game.state.compute_zobrist()
+        game.undo_moves(undo)
+        assert snapshot(game) == before
+        assert game.state.zobrist == game.state.compute_zobrist()
+        game.apply_moves(moves)
+        if game_mode == 'turn_by_turn':
+            game.state.current_player_team = OPPONENT[game.state.current_player_team]
+
+@pytest.mark.parametrize('game_mode', ['turn_by_turn', 'simultaneous'])
+def test_undo_unwinds_a_whole_game(game_mode):
+    random.seed(7)
+    game = KabaddiGame(game_mode, turn_limit=80)
+    start = snapshot(game)
+    history = []
+    while game.check_terminal_state() is None:
+        history.append((snapshot(game), game.state.current_player_team, game.apply_moves(random_moves(game))))
+        if game_mode == 'turn_by_turn':
+            game.state.current_player_team = OPPONENT[game.state.current_player_team]
+    for before, team, undo in reversed(history):
+        game.undo_moves(undo)
+        game.state.current_player_team = team
+        assert snapshot(game) == before
+        assert game.state.zobrist == game.state.compute_zobrist()
+    assert snapshot(game) == start
+
+@pytest.mark.parametrize('grid_size, team_size', [((10, 10), 2), ((30, 30), 5)])
+def test_pickled_game_leaves_board_tables_behind(grid_size, team_size):
+    random.seed(3)
+    game = KabaddiGame(grid_size=grid_size, team_size=team_size)
+    for _ in range(6):
+        game.apply_moves(random_moves(game))
+        game.state.current_player_team = OPPONENT[game.state.current_player_team]
+    data = pickle.dumps(game)
+    assert len(data) < 2000
+    copy = pickle.loads(data)
+    assert snapshot(copy) == snapshot(game)
+    assert copy.state.zobrist == copy.state.compute_zobrist()
+    assert copy.state.grid_tables is game.state.grid_tables
+    assert copy.get_valid_moves('A1') == game.get_valid_moves('A1')
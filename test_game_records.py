@@ -0,0 +1,56 @@
+from game_records import ResultsStream
+from tournament import run_tournament
+from agents import RandomAgent, GreedyAgent, MCTSAgent, SearchStats
+
+AGENTS = [{'name': 'Random', 'class': RandomAgent}, {'name': 'Greedy', 'class': GreedyAgent}]
+LAYOUT = {'A': [(2, 1), (3, 6)], 'B': [(6, 3), (7, 8)]}
+
+def records(path):
+    return list(ResultsStream(str(path)))
+
+def test_start_layout_is_recorded_replayed_and_part_of_the_key(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    run_tournament(AGENTS, 2, 'turn_by_turn', 40, seed=0, results_path=str(path), move_log=True, start_layout=LAYOUT)
+    stream = ResultsStream(str(path))
+    for record in stream:
+        assert record['start_layout'] == {'A': [[2, 1], [3, 6]], 'B': [[6, 3], [7, 8]]}
+        replay = stream.replay(record)
+        opening = next(replay)
+        assert {p.id: p.pos for p in opening.state.player_list} == {'A1': (2, 1), 'A2': (3, 6), 'B1': (6, 3), 'B2': (7, 8)}
+        *_, last = replay
+        assert last.state.turn == record['turns']
+        assert (last.check_terminal_state() or 'draw') == record['winner']
+
+    # The same tournament from the default layout is a different set of games.
+    run_tournament(AGENTS, 2, 'turn_by_turn', 40, seed=0, results_path=str(path), move_log=True)
+    assert len(records(path)) == 8
+    # Rerunning either one plays nothing new.
+    run_tournament(AGENTS, 2, 'turn_by_turn', 40, seed=0, results_path=str(path), start_layout=LAYOUT)
+    assert len(records(path)) == 8
+
+def test_changed_agent_params_are_not_taken_as_played(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    run_tournament(AGENTS, 1, 'turn_by_turn', 30, seed=0, results_path=str(path))
+    assert records(path)[0]['config_B'] == 'agents.GreedyAgent()'
+    changed = [AGENTS[0], {'name': 'Greedy', 'class': GreedyAgent, 'params': {'max_branching': 25}}]
+    run_tournament(changed, 1, 'turn_by_turn', 30, seed=0, results_path=str(path))
+    assert len(records(path)) == 4
+    assert records(path)[-1]['config_A'] == 'agents.GreedyAgent(max_branching=25)'
+    run_tournament(changed, 1, 'turn_by_turn', 30, seed=0, results_path=str(path))
+    assert len(records(path)) == 4
+
+def test_adaptive_header_reports_games_played(tmp_path, capsys):
+    run_tournament(AGENTS, 30, 'turn_by_turn', 30, seed=0, adaptive=True)
+    header = next(line for line in capsys.readouterr().out.splitlines() if 'Tournament Results' in line)
+    assert 'up to 30 games per matchup' in header
+    assert int(header.split(', ')[1].split()[0]) < 60
+
+def test_search_stats_from_every_agent_can_be_streamed(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    agents = AGENTS + [{'name': 'MCTS', 'class': MCTSAgent, 'params': {'time_limit': 0.05}}]
+    _, _, agent_stats = run_tournament(agents, 1, 'turn_by_turn', 20, grid_size=(6, 4), team_size=1, seed=0, stats=True, results_path=str(path))
+    assert len(records(path)) == 6
+    assert all(record['stats'] for record in records(path))
+    for summary in agent_stats.values():
+        assert all(type(summary[name]) is int for name in SearchStats.COUNTERS + ('max_depth',))
+    assert agent_stats['MCTS']['nodes'] > 0
@@ -0,0 +1,80 @@
+import random
+import pytest
+from game_environment import KabaddiGame, OPPONENT
+from agents import GreedyAgent, AlphaBetaAgent, IncrementalEvaluator, RandomAgent
+
+class BothTeams:
+    # Observer that forwards to one evaluator per team.
+    def __init__(self, game):
+        self.evaluators = [IncrementalEvaluator(game, team) for team in ('A', 'B')]
+
+    def applied(self, undo):
+        for evaluator in self.evaluators: evaluator.applied(undo)
+
+    def undone(self, undo):
+        for evaluator in self.evaluators: evaluator.undone(undo)
+
+def assert_agrees(observer, agents, game):
+    for evaluator, agent in zip(observer.evaluators, agents):
+        expected = agent._evaluate(game)
+        value = evaluator.score()
+        assert value == expected and type(value) is type(expected)
+
+def random_moves(game):
+    if game.game_mode == 'turn_by_turn':
+        moves = RandomAgent(game.state.current_player_team).select_moves(game)
+    else:
+        moves = {**RandomAgent('A').select_moves(game), **RandomAgent('B').select_moves(game)}
+    # Single-player moves, as GreedyAgent._candidate_moves makes them.
+    if moves and random.random() < 0.2:
+        player_id = random.choice(list(moves))
+        moves = {player_id: moves[player_id]}
+    return moves
+
+@pytest.mark.parametrize('game_mode', ['turn_by_turn', 'simultaneous'])
+def test_matches_full_evaluation_through_apply_and_undo(game_mode):
+    seen = {'pickups': 0, 'captures': 0, 'wins': 0}
+    for seed in range(60):
+        random.seed(seed)
+        grid_size, team_size = random.choice([((10, 10), 2), ((6, 4), 1), ((8, 8), 3), ((12, 6), 5), ((12, 12), 9)])
+        game = KabaddiGame(game_mode, turn_limit=80, grid_size=grid_size, team_size=team_size)
+        observer = game.observer = BothTeams(game)
+        agents = [GreedyAgent('A'), GreedyAgent('B')]
+        stack = []
+        for _ in range(200):
+            assert_agrees(observer, agents, game)
+            winner = game.check_terminal_state()
+            if winner in ('A', 'B'): seen['wins'] += 1
+            # Walk back and forth so undo is exercised from every kind of position.
+            if (winner is not None and winner != 'draw') or (stack and random.random() < 0.3):
+                if not stack: break
+                game.undo_moves(stack.pop())
+                continue
+            undo = game.apply_moves(random_moves(game))
+            seen['pickups'] += bool(undo[1])
+            seen['captures'] += bool(undo[2])
+            stack.append(undo)
+            if game_mode == 'turn_by_turn' and random.random() < 0.8:
+                game.state.current_player_team = OPPONENT[game.state.current_player_team]
+        while stack:
+            game.undo_moves(stack.pop())
+            assert_agrees(observer, agents, game)
+    assert all(seen.values()), seen
+
+@pytest.mark.parametrize('game_mode', ['turn_by_turn', 'simultaneous'])
+def test_search_results_do_not_depend_on_the_evaluator(game_mode):
+    for seed in range(4):
+        random.seed(seed)
+        game = KabaddiGame(game_mode, turn_limit=60)
+        for _ in range(12):
+            game.apply_moves(random_moves(game))
+            if game_mode == 'turn_by_turn':
+                game.state.current_player_team = OPPONENT[game.state.current_player_team]
+        team = game.state.current_player_team
+        for agent_class, params in ((GreedyAgent, {}), (AlphaBetaAgent, {'depth': 2})):
+            choices = []
+            for incremental in (True, False):
+                random.seed(seed)
+                choices.append(agent_class(team, incremental=incremental, **params).select_moves(game))
+            assert choices[0] == choices[1]
+            assert game.observer is None
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from game_environment import KabaddiGame
+from agents import MatrixGameAgent, solve_matrix_game
+
+def test_matching_pennies_is_an_even_mix():
+    strategy, value = solve_matrix_game(np.array([[1.0, -1.0], [-1.0, 1.0]]))
+    assert value == pytest.approx(0.0)
+    assert strategy == pytest.approx([0.5, 0.5])
+
+def test_rock_paper_scissors_is_close_to_uniform():
+    strategy, value = solve_matrix_game(np.array([[0.0, -1.0, 1.0], [1.0, 0.0, -1.0], [-1.0, 1.0, 0.0]]))
+    assert value == pytest.approx(0.0, abs=0.05)
+    assert strategy == pytest.approx([1 / 3] * 3, abs=0.05)
+
+def test_saddle_point_is_played_pure():
+    strategy, value = solve_matrix_game(np.array([[3.0, 1.0], [4.0, 2.0]]))
+    assert list(strategy) == [0.0, 1.0]
+    assert value == 2.0 and type(value) is float
+
+@pytest.mark.parametrize('team_size', [2, 4, 9])
+def test_matrix_nodes_use_the_whole_branching_budget(team_size):
+    game = KabaddiGame('simultaneous', grid_size=(12, 12), team_size=team_size)
+    agent = MatrixGameAgent('A', depth=1)
+    agent.enable_stats()
+    with agent._incremental_evaluation(game):
+        my_moves, strategy, _ = agent._solve_node(game, 1)
+    assert len(my_moves) == len(set(my_moves)) == 9
+    assert agent.stats.nodes == 81
+    assert len(strategy) == 9
+
+def test_ranked_joint_moves_start_from_everyone_s_best():
+    game = KabaddiGame('simultaneous', team_size=4)
+    ranked = {f'A{i}': game.get_valid_moves(f'A{i}') for i in range(1, 5)}
+    moves = list(game.ranked_joint_moves('A', ranked, 9))
+    assert len(moves) == len(set(moves)) == 9
+    assert moves[0] == tuple((player_id, options[0]) for player_id, options in ranked.items())
+    # Every move past the first changes exactly one player's choice to their second best.
+    assert all(sum(pos != ranked[player_id][0] for player_id, pos in move) == 1 for move in moves[1:5])
@@ -0,0 +1,71 @@
+import pytest
+from game_environment import KabaddiGame
+from tablebase import Tablebase, generate
+
+class Interrupted(Exception):
+    pass
+
+def quiet(*args):
+    pass
+
+@pytest.fixture(scope='module')
+def tablebase(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('tablebase') / 'tablebase_4x3.bin')
+    generate(path, (4, 3), log=quiet)
+    return Tablebase(path)
+
+def lost_position():
+    # B1 alone against A1 and A2 on B's home side; stepping onto A1's square gets B1 captured.
+    game = KabaddiGame(turn_limit=100, grid_size=(4, 3), team_size=2)
+    players = game.state.players
+    players['A1'].pos = (0, 0)
+    players['A2'].pos = (1, 0)
+    players['B1'].pos = (0, 1)
+    players['B2'].pos = (0, 2)
+    players['B2'].is_captured = True
+    game.state.current_player_team = 'B'
+    game.state.zobrist = game.state.compute_zobrist()
+    return game
+
+def test_lost_position_delays_instead_of_losing_at_once(tablebase):
+    game = lost_position()
+    assert tablebase.probe(game) == -4
+    moves = tablebase.select_moves(game)
+    undo = game.apply_moves(moves)
+    assert game.check_terminal_state() is None
+    game.state.current_player_team = 'A'
+    assert tablebase.probe(game) == 3
+    game.undo_moves(undo)
+
+def test_no_losing_move_is_chosen_while_a_slower_loss_exists(tablebase):
+    game = lost_position()
+    assert tablebase.select_moves(game) == {'B1': (0, 2)}
+
+@pytest.mark.parametrize('calls', [40, None])
+def test_interrupted_sweep_resumes_to_the_same_table(tmp_path, monkeypatch, calls):
+    clean = str(tmp_path / 'clean.bin')
+    generate(clean, (4, 3), chunk_size=4096, log=quiet)
+    # Kill the 2v1 ply 3 sweep partway through its blocks (calls=40), or after
+    # all of them but before its progress is saved (calls=None).
+    sweep, step = Tablebase._sweep, Tablebase._step
+    count = [0]
+    def killed_sweep(self, material, n, chunk_size):
+        killing = material == (2, 1) and n == 3
+        if killing and calls is not None: monkeypatch.setattr(Tablebase, '_step', killed_step)
+        found = sweep(self, material, n, chunk_size)
+        if killing: raise Interrupted
+        return found
+    def killed_step(self, *args):
+        count[0] += 1
+        if count[0] > calls: raise Interrupted
+        return step(self, *args)
+    monkeypatch.setattr(Tablebase, '_sweep', killed_sweep)
+    path = str(tmp_path / 'resumed.bin')
+    with pytest.raises(Interrupted):
+        generate(path, (4, 3), chunk_size=4096, log=quiet)
+    monkeypatch.setattr(Tablebase, '_sweep', sweep)
+    monkeypatch.setattr(Tablebase, '_step', step)
+    resumed = generate(path, (4, 3), chunk_size=4096, log=quiet)
+    assert resumed.counts() == Tablebase(clean).counts()
+    with open(path, 'rb') as a, open(clean, 'rb') as b:
+        assert a.read() == b.read()
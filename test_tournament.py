@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+from game_records import ResultsStream, record_key
+from tournament import run_tournament
+from agents import RandomAgent, GreedyAgent, AlphaBetaAgent
+
+AGENTS = [
+    {'name': 'Random', 'class': RandomAgent},
+    {'name': 'Greedy', 'class': GreedyAgent},
+    {'name': 'AlphaBeta', 'class': AlphaBetaAgent, 'params': {'depth': 2}},
+]
+
+def played(path):
+    # Games come back in completion order from a pool; compare them by key.
+    stream = ResultsStream(str(path), move_log=True)
+    return {record_key(record): (record['winner'], record['turns'], stream.read_moves(record)) for record in stream}
+
+@pytest.mark.parametrize('game_mode', ['turn_by_turn', 'simultaneous'])
+def test_worker_pool_plays_the_same_games_as_a_single_process(tmp_path, game_mode):
+    outcomes = []
+    for workers in (1, 2):
+        path = tmp_path / f'results_{workers}.jsonl'
+        results, draws = run_tournament(AGENTS, 2, game_mode, 30, seed=0, workers=workers, results_path=str(path), move_log=True)
+        outcomes.append((results, draws, played(path)))
+    (results_1, draws_1, games_1), (results_2, draws_2, games_2) = outcomes
+    pd.testing.assert_frame_equal(results_1, results_2)
+    pd.testing.assert_frame_equal(draws_1, draws_2)
+    assert games_1 == games_2 and len(games_1) == 12
@@ -1,17 +1,145 @@
+import os
+import random
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 import pandas as pd
 from tqdm import tqdm
 from game_environment import KabaddiGame
-from agents import RandomAgent, GreedyAgent, AlphaBetaAgent, HybridAlphaBetaAgent, MCTSAgent
+from game_records import ResultsStream, agent_fingerprint, record_key, layout_record
+from ratings import SequentialTest, bradley_terry
+from agents import RandomAgent, GreedyAgent, AlphaBetaAgent, HybridAlphaBetaAgent, MCTSAgent, SearchStats
 
-def run_single_match(agent_A_class, agent_B_class, game_mode, turn_limit, agent_A_params={}, agent_B_params={}):
+def play_match(agent_A_class, agent_B_class, game_mode, turn_limit, agent_A_params={}, agent_B_params={}, grid_size=(10, 10), team_size=2, seed=None, stats=False, profiler=None, record_moves=False, start_layout=None):
+    # profiler: any context manager to run the game under, e.g. cProfile.Profile().
+    # Returns (winner, game) so callers can read game.agent_stats, think_time and move_log.
+    if seed is not None:
+        random.seed(seed)
     agent_A = agent_A_class(team='A', **agent_A_params)
     agent_B = agent_B_class(team='B', **agent_B_params)
-    game = KabaddiGame(game_mode=game_mode, turn_limit=turn_limit)
-    winner = game.run_game_loop(agent_A, agent_B)
-    return winner
+    if stats:
+        agent_A.enable_stats()
+        agent_B.enable_stats()
+    game = KabaddiGame(game_mode=game_mode, turn_limit=turn_limit, grid_size=grid_size, team_size=team_size, start_layout=start_layout)
+    if profiler is not None:
+        with profiler:
+            winner = game.run_game_loop(agent_A, agent_B, record_moves)
+    else:
+        winner = game.run_game_loop(agent_A, agent_B, record_moves)
+    return winner, game
 
-def run_tournament(agent_configs, num_games, game_mode, turn_limit=100):
-    print(f"\n--- Starting Tournament: {game_mode.upper()} Mode ---")
+def run_single_match(agent_A_class, agent_B_class, game_mode, turn_limit, agent_A_params={}, agent_B_params={}, grid_size=(10, 10), team_size=2, seed=None, stats=False, profiler=None, start_layout=None):
+    # With stats=True, returns (winner, {'A': summary, 'B': summary}).
+    winner, game = play_match(agent_A_class, agent_B_class, game_mode, turn_limit, agent_A_params, agent_B_params, grid_size, team_size, seed, stats, profiler, start_layout=start_layout)
+    return (winner, game.agent_stats) if stats else winner
+
+def game_seed(seed, name_A, name_B, game_index):
+    if seed is None: return None
+    return zlib.crc32(f"{seed}:{name_A}:{name_B}:{game_index}".encode())
+
+def _play_task(task):
+    record, (class_A, params_A), (class_B, params_B), stats, record_moves = task
+    start_time = time.perf_counter()
+    winner, game = play_match(
+        class_A, class_B, record['mode'], record['turn_limit'], params_A, params_B,
+        tuple(record['grid_size']), record['team_size'], record['seed'], stats,
+        record_moves=record_moves, start_layout=record.get('start_layout'),
+    )
+    record = dict(
+        record, winner=winner, turns=game.state.turn, seconds=round(time.perf_counter() - start_time, 4),
+        think_seconds={team: round(elapsed, 4) for team, elapsed in game.think_time.items()},
+    )
+    if stats: record['stats'] = game.agent_stats
+    return record, (bytes(game.move_log) if record_moves else None)
+
+def _record_result(results, draws, matchups, agent_stats, record):
+    # matchups: {(name_A, name_B): [A wins, draws, B wins, seconds played]}
+    name_A, name_B, winner = record['agent_A'], record['agent_B'], record['winner']
+    tally = matchups.setdefault((name_A, name_B), [0, 0, 0, 0.0])
+    if winner == 'A':
+        results.loc[name_A, name_B] += 1
+        tally[0] += 1
+    elif winner == 'draw':
+        draws.loc[name_A, name_B] += 1
+        tally[1] += 1
+    else:
+        tally[2] += 1
+    tally[3] += record.get('seconds', 0.0)
+    game_stats = record.get('stats')
+    if game_stats:
+        for team, name in (('A', name_A), ('B', name_B)):
+            SearchStats.merge(agent_stats.setdefault(name, {}), game_stats[team])
+
+def stats_table(agent_stats):
+    rows = {}
+    for name, summary in agent_stats.items():
+        row = {counter: summary[counter] for counter in SearchStats.COUNTERS}
+        row['max_depth'] = summary['max_depth']
+        select_time = summary['time'].get('select_moves', 0.0)
+        row['ms/move'] = round(1000 * select_time / max(1, summary['moves']), 2)
+        row['nodes/s'] = round(summary['nodes'] / select_time) if select_time else 0
+        for phase, elapsed in summary['time'].items():
+            if phase != 'select_moves': row[f'{phase} s'] = round(elapsed, 3)
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient='index').fillna(0)
+
+def ratings_table(matchups, agent_names):
+    scores = {matchup: (wins + 0.5 * draws, wins + draws + losses) for matchup, (wins, draws, losses, _) in matchups.items()}
+    ratings = bradley_terry(scores, agent_names)
+    games = {name: 0 for name in agent_names}
+    for (name_A, name_B), (_, games_played) in scores.items():
+        games[name_A] += games_played
+        games[name_B] += games_played
+    table = pd.DataFrame({
+        'Elo': {name: round(elo) for name, (elo, _) in ratings.items()},
+        '+/- (95%)': {name: round(1.96 * error) for name, (_, error) in ratings.items()},
+        'Games': games,
+    })
+    return table.sort_values(by='Elo', ascending=False)
+
+def load_results(results_path, game_mode, agent_names=None):
+    # Rebuilds the tables from a results stream, one line at a time; move logs stay on disk.
+    # Returns (results, draws, matchups, agent_stats), with matchups as in _record_result.
+    stream = ResultsStream(results_path)
+    if agent_names is None:
+        agent_names = list(dict.fromkeys(
+            name for record in stream if record['mode'] == game_mode for name in (record['agent_A'], record['agent_B'])
+        ))
+    results = pd.DataFrame(0, index=agent_names, columns=agent_names, dtype=int)
+    draws = pd.DataFrame(0, index=agent_names, columns=agent_names, dtype=int)
+    matchups = {}
+    agent_stats = {}
+    for record in stream:
+        if record['mode'] == game_mode and record['agent_A'] in results.index and record['agent_B'] in results.index:
+            _record_result(results, draws, matchups, agent_stats, record)
+    return results, draws, matchups, agent_stats
+
+def print_adaptive_summary(test, matchups, pending, budget):
+    rows = {}
+    for (name_A, name_B), (wins, draws, losses, _) in matchups.items():
+        verdict = test.decide(wins, draws, losses)
+        rows[f"{name_A} vs {name_B}"] = {
+            'Games': wins + draws + losses, 'A wins': wins, 'Draws': draws, 'B wins': losses,
+            'Result': {'A': name_A, 'B': name_B, 'even': 'even', None: 'open'}[verdict],
+        }
+    print("\nMATCHUPS (adaptive):")
+    print(pd.DataFrame.from_dict(rows, orient='index'))
+    played = sum(sum(tally[:3]) for tally in matchups.values())
+    # Games not played are costed at the average length of their own matchup's games.
+    seconds_saved = sum(
+        len(queue) * matchups[matchup][3] / max(1, sum(matchups[matchup][:3]))
+        for matchup, queue in pending.items() if matchup in matchups
+    )
+    print(f"Played {played} of {budget} games ({1 - played / budget:.0%} saved, about {seconds_saved:.1f} s of play)")
+
+def run_tournament(agent_configs, num_games, game_mode, turn_limit=100, grid_size=(10, 10), team_size=2, workers=1, seed=None, stats=False, results_path=None, move_log=False, adaptive=None, start_layout=None):
+    # With stats=True, also returns per-agent search stats summed over all games.
+    # With results_path, every finished game is appended to that JSONL stream (and its moves to
+    # results_path + '.moves' when move_log is set); games already in the stream are not replayed.
+    # adaptive: a SequentialTest (or True for the default one). Games are then played in waves and a
+    # matchup stops once the test settles it; num_games becomes the most any matchup can get.
+    print(f"\n--- Starting Tournament: {game_mode.upper()} Mode ({team_size}v{team_size} on {grid_size[0]}x{grid_size[1]}) ---")
     
     agent_names = [config['name'] for config in agent_configs]
     results = pd.DataFrame(0, index=agent_names, columns=agent_names, dtype=int)
@@ -22,32 +150,74 @@ def run_tournament(agent_configs, num_games, game_mode, turn_limit=100):
         print("Not enough agents to run a tournament.")
         return
 
-    with tqdm(total=total_matchups * num_games, desc=f"Overall Progress ({game_mode})") as pbar:
-        for i, agent_A_config in enumerate(agent_configs):
-            for j, agent_B_config in enumerate(agent_configs):
-                if i == j: continue
-
-                wins_A = 0
-                draw_count = 0 
-                for _ in range(num_games):
-                    winner = run_single_match(
-                        agent_A_config['class'], 
-                        agent_B_config['class'], 
-                        game_mode, 
-                        turn_limit,
-                        agent_A_config.get('params', {}),
-                        agent_B_config.get('params', {})
-                    )
-                    if winner == 'A':
-                        wins_A += 1
-                    elif winner == 'draw':
-                        draw_count += 1
-                    pbar.update(1)
-
-                results.loc[agent_A_config['name'], agent_B_config['name']] = wins_A
-                draws.loc[agent_A_config['name'], agent_B_config['name']] = draw_count
+    tasks = {}
+    for i, agent_A_config in enumerate(agent_configs):
+        for j, agent_B_config in enumerate(agent_configs):
+            if i == j: continue
+            for game_index in range(num_games):
+                record = {
+                    'mode': game_mode, 'agent_A': agent_A_config['name'], 'agent_B': agent_B_config['name'],
+                    'config_A': agent_fingerprint(agent_A_config['class'], agent_A_config.get('params', {})),
+                    'config_B': agent_fingerprint(agent_B_config['class'], agent_B_config.get('params', {})),
+                    'turn_limit': turn_limit, 'grid_size': list(grid_size), 'team_size': team_size, 'game_index': game_index,
+                    'start_layout': layout_record(start_layout),
+                    'seed': game_seed(seed, agent_A_config['name'], agent_B_config['name'], game_index),
+                }
+                tasks[record_key(record)] = (
+                    record,
+                    (agent_A_config['class'], agent_A_config.get('params', {})),
+                    (agent_B_config['class'], agent_B_config.get('params', {})),
+                    stats, move_log,
+                )
+
+    matchups = {}
+    agent_stats = {}
+    stream = ResultsStream(results_path, move_log) if results_path else None
+    if stream is not None:
+        for record in stream:
+            if tasks.pop(record_key(record), None) is not None:
+                _record_result(results, draws, matchups, agent_stats, record)
+        finished = total_matchups * num_games - len(tasks)
+        if finished: print(f"Resuming: {finished} games already in {results_path}")
+
+    if adaptive is True: adaptive = SequentialTest()
+    pending = {}
+    for task in tasks.values():
+        pending.setdefault((task[0]['agent_A'], task[0]['agent_B']), []).append(task)
+
+    def is_open(matchup):
+        return bool(pending[matchup]) and (adaptive is None or adaptive.decide(*matchups.get(matchup, (0, 0, 0))[:3]) is None)
+
+    def finish(record, moves):
+        if stream is not None: stream.append(record, moves)
+        _record_result(results, draws, matchups, agent_stats, record)
+        pbar.update(1)
+
+    with tqdm(total=len(tasks), desc=f"Overall Progress ({game_mode})") as pbar, \
+            (ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext()) as executor:
+        while True:
+            open_matchups = [matchup for matchup in pending if is_open(matchup)]
+            if not open_matchups: break
+            # Without a test every game goes in one wave; with one, each open matchup gets enough
+            # games to keep the workers busy before the test looks at it again.
+            per_matchup = None if adaptive is None else -(-workers // len(open_matchups))
+            wave = []
+            for matchup in open_matchups:
+                wave += pending[matchup][:per_matchup]
+                del pending[matchup][:per_matchup]
+            if executor is not None:
+                for future in as_completed([executor.submit(_play_task, task) for task in wave]):
+                    finish(*future.result())
+            else:
+                for task in wave:
+                    finish(*_play_task(task))
                 
-    print(f"\n--- Tournament Results: {game_mode.upper()} Mode ({num_games} games per matchup) ---")
+    if adaptive is None:
+        games_label = f"{num_games} games per matchup"
+    else:
+        played = sum(sum(tally[:3]) for tally in matchups.values())
+        games_label = f"up to {num_games} games per matchup, {played} played"
+    print(f"\n--- Tournament Results: {game_mode.upper()} Mode ({games_label}) ---")
     print("\nWIN COUNT (Row player vs Column player):")
     print(results)
     
@@ -67,12 +237,26 @@ def run_tournament(agent_configs, num_games, game_mode, turn_limit=100):
     
     print("\nOVERALL SUMMARY:")
     print(summary.sort_values(by='Total Wins', ascending=False))
+    print("\nRATINGS (Bradley-Terry, draws count half):")
+    print(ratings_table(matchups, agent_names))
+    if adaptive is not None:
+        print_adaptive_summary(adaptive, matchups, pending, total_matchups * num_games)
+    if stats:
+        print("\nSEARCH STATS (all games, per agent):")
+        print(stats_table(agent_stats))
     print("-" * 50)
+    if stats:
+        return results, draws, agent_stats
+    return results, draws
 
 if __name__ == "__main__":
     GAMES_PER_MATCHUP = 20
     TURN_LIMIT = 100
     TIME_LIMIT = 0.5 
+    WORKERS = os.cpu_count() or 1
+    SEED = 0
+    RESULTS_PATH = 'tournament_results.jsonl'
+    ADAPTIVE = SequentialTest(elo=150)
     
     turn_by_turn_agents = [
         {'name': 'Random', 'class': RandomAgent},
@@ -80,7 +264,7 @@ if __name__ == "__main__":
         {'name': 'AlphaBeta (d=2)', 'class': AlphaBetaAgent, 'params': {'depth': 2}},
         {'name': 'MCTS (t=0.5s)', 'class': MCTSAgent, 'params': {'time_limit': TIME_LIMIT}} 
     ]
-    run_tournament(turn_by_turn_agents, GAMES_PER_MATCHUP, 'turn_by_turn', TURN_LIMIT)
+    run_tournament(turn_by_turn_agents, GAMES_PER_MATCHUP, 'turn_by_turn', TURN_LIMIT, workers=WORKERS, seed=SEED, results_path=RESULTS_PATH, adaptive=ADAPTIVE)
 
     simultaneous_agents = [
         {'name': 'Random', 'class': RandomAgent},
@@ -89,5 +273,5 @@ if __name__ == "__main__":
         {'name': 'AlphaBeta (Fallback)', 'class': HybridAlphaBetaAgent, 'params': {'depth': 2}},
         {'name': 'MCTS (t=0.5s)', 'class': MCTSAgent, 'params': {'time_limit': TIME_LIMIT}}
     ]
-    run_tournament(simultaneous_agents, GAMES_PER_MATCHUP, 'simultaneous', TURN_LIMIT)
+    run_tournament(simultaneous_agents, GAMES_PER_MATCHUP, 'simultaneous', TURN_LIMIT, workers=WORKERS, seed=SEED, results_path=RESULTS_PATH, adaptive=ADAPTIVE)
 